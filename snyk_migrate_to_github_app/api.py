@@ -0,0 +1,798 @@
+"""Requests to the Snyk APIs
+"""
+
+# ===== IMPORTS =====
+
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from rich import print
+
+from snyk_migrate_to_github_app.constants import SNYK_V1_API_BASE_URL, SNYK_V1_API_BASE_URL_AU, SNYK_V1_API_BASE_URL_EU, SNYK_REST_API_BASE_URL, SNYK_REST_API_BASE_URL_AU, SNYK_REST_API_BASE_URL_EU, SNYK_REST_API_VERSION, SNYK_HIDDEN_API_BASE_URL, SNYK_HIDDEN_API_BASE_URL_AU, SNYK_HIDDEN_API_BASE_URL_EU, SNYK_HIDDEN_API_VERSION, SNYK_API_TIMEOUT_DEFAULT, SNYK_POOL_HOSTS, SNYK_PIPELINE_DEPTH
+from snyk_migrate_to_github_app.state import state, output
+from snyk_migrate_to_github_app.target import Target
+from snyk_migrate_to_github_app.throttling import RetryPolicy, retry_after
+from snyk_migrate_to_github_app.metrics import endpoint_name
+from snyk_migrate_to_github_app.tracing import trace, in_context
+
+# ===== CLASSES =====
+
+class TargetListingError(requests.RequestException):
+    """A page of targets could not be retrieved, so the listing of an org is incomplete
+    """
+
+# ===== METHODS =====
+
+def get_group_orgs(snyk_token, group_id, tenant='', session=requests):
+    """Helper function to retrieve the organizations in a Snyk group
+
+    Args:
+        snyk_token (str): Snyk API token
+        group_id (str): Snyk Group ID
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Returns:
+        list: (org ID, org name) of every organization in the group
+    """
+    orgs = []
+
+    headers = {
+        'Authorization': f'token {snyk_token}'
+    }
+
+    base_url = SNYK_REST_API_BASE_URL
+
+    if tenant == 'au':
+        base_url = SNYK_REST_API_BASE_URL_AU
+    if tenant == 'eu':
+        base_url = SNYK_REST_API_BASE_URL_EU
+
+    url = f'{base_url}/rest/groups/{group_id}/orgs?version={SNYK_REST_API_VERSION}&limit=100'
+
+    while True:
+        try:
+            response = api_request(
+                session,
+                'GET',
+                url,
+                headers=headers,
+                timeout=SNYK_API_TIMEOUT_DEFAULT)
+        except requests.RequestException as exc:
+            print(f"Unable to retrieve organizations for Snyk group: {group_id}, reason: {exc}")
+            return []
+
+        if response.status_code != 200:
+            print(f"Unable to retrieve organizations for Snyk group: {group_id}, reason: {response.status_code}")
+            return []
+
+        response_json = json.loads(response.content)
+
+        for org in response_json.get('data', []):
+            orgs.append((org['id'], org.get('attributes', {}).get('name', '')))
+
+        if 'next' not in response_json.get('links', {}) or response_json['links']['next'] == '':
+            break
+        url = f"{base_url}/{response_json['links']['next']}"
+
+    return orgs
+
+def create_session(pool_size):
+    """Create the HTTP session shared by every API call in a run
+
+    Connections are kept alive between requests, so only the first request to each
+    Snyk API host pays for the TLS handshake. The pool should be at least as large as
+    the number of concurrent requests, otherwise workers block waiting for a free slot.
+
+    Args:
+        pool_size (int): Maximum number of connections kept alive per host
+
+    Returns:
+        requests.Session: session with a connection pool mounted for http and https
+    """
+    session = requests.Session()
+
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=SNYK_POOL_HOSTS,
+        pool_maxsize=pool_size,
+        pool_block=True)
+
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
+
+def verify_org_integrations(snyk_token, org_id, github_server_app=False, tenant='', session=requests):
+    """Helper function to make sure the Snyk Organization has the relevant github integrations set up
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Returns:
+        bool: _description_
+    """
+    headers = {
+        'Authorization': f'token {snyk_token}'
+    }
+
+    base_url = SNYK_V1_API_BASE_URL
+
+    if tenant == 'au':
+        base_url = SNYK_V1_API_BASE_URL_AU
+    if tenant == 'eu':
+        base_url = SNYK_V1_API_BASE_URL_EU
+
+    url = f"{base_url}/org/{org_id}/integrations"
+
+    try:
+        response = api_request(
+            session,
+            'GET',
+            url,
+            headers=headers,
+            timeout=SNYK_API_TIMEOUT_DEFAULT
+        )
+    except requests.ConnectionError:
+        print(f"Unable to connect to {base_url}")
+        return False
+
+    return check_org_integrations(org_id, response, github_server_app=github_server_app)
+
+def check_org_integrations(org_id, response, github_server_app=False):
+    """Check the integrations of an org, as returned by the V1 API, for those the migration needs
+
+    Args:
+        org_id (str): Snyk Organization ID
+        response (requests.Response): response from the integrations endpoint
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+
+    Returns:
+        bool: True when the org has the required integrations
+    """
+    if response.status_code != 200:
+        print(f"Unable to retrieve integrations for Snyk org: {org_id}, reason: {response.status_code}")
+        return False
+
+    integrations = json.loads(response.content)
+
+    if ('github-enterprise' not in integrations and
+        'github' not in integrations):
+
+        print(f"No GitHub or GitHub Enterprise integration detected for Snyk Org: {org_id}")
+        return False
+
+    if (github_server_app):
+        if ('github-server-app' not in integrations):
+            print(f"No GitHub Server App integration detected for Snyk Org: {org_id}, please set up before migrating GitHub or GitHub Enterprise targets")
+    else:
+        if ('github-cloud-app' not in integrations):
+            print(f"No GitHub Cloud App integration detected for Snyk Org: {org_id}, please set up before migrating GitHub or GitHub Enterprise targets")
+            return False
+
+    return True
+
+def get_all_targets(snyk_token, org_id, origin='github-enterprise', tenant='', session=requests):
+    """Helper function to retrieve targets in an org
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origin (str, optional): Filter to retrieve targets of a certain origin. Defaults to 'github-enterprise'.
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Returns:
+        list[Target]: github targets in a snyk org
+    """
+    return list(iter_targets(snyk_token, org_id, origin=origin, tenant=tenant, session=session))
+
+def get_targets_for_origins(snyk_token, org_id, origins, tenant='', session=requests):
+    """Helper function to retrieve the targets of several origins in an org, listing every origin concurrently
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origins (list): Origins to retrieve targets for
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Returns:
+        list[Target]: github targets in a snyk org, each target only once
+    """
+    with ThreadPoolExecutor(max_workers=len(origins)) as executor:
+        origin_targets = executor.map(
+            in_context(lambda origin: get_all_targets(snyk_token, org_id, origin=origin, tenant=tenant, session=session)),
+            origins)
+
+        return unique_targets(target for targets in origin_targets for target in targets)
+
+def unique_targets(targets):
+    """Drop targets that were already seen, keyed by target ID
+
+    Args:
+        targets (iterable): Targets, possibly listed more than once
+
+    Returns:
+        list[Target]: targets in their original order, each target only once
+    """
+    return list({target.id: target for target in targets}.values())
+
+def get_migrated_index(snyk_token, org_id, github_server_app=False, tenant='', session=requests):
+    """Helper function to index the repositories that already have a GitHub App target in an org
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Returns:
+        dict: repository URLs of the targets already using the GitHub App integration, their display names,
+            and the display names of those without a URL
+    """
+    source_type = 'github-cloud-app'
+
+    if github_server_app:
+        source_type = 'github-server-app'
+
+    return index_migrated(iter_targets(snyk_token, org_id, origin=source_type, tenant=tenant, session=session))
+
+def index_migrated(targets):
+    """Index the repositories of targets already using the GitHub App integration
+
+    Args:
+        targets (iterable): GitHub App targets of an org
+
+    Returns:
+        dict: repository URLs of the targets, their display names, and the display names of those without a URL
+    """
+    index = {'urls': set(), 'names': set(), 'names_without_url': set()}
+
+    for target in targets:
+        url = repository_url(target)
+        name = (target.display_name or '').lower()
+
+        if url:
+            index['urls'].add(url)
+        elif name:
+            index['names_without_url'].add(name)
+        if name:
+            index['names'].add(name)
+
+    return index
+
+def exclude_migrated(targets, index):
+    """Leave out targets whose repository already has a GitHub App target
+
+    Args:
+        targets (iterable): Targets to be migrated
+        index (dict): Repository URLs and names built by get_migrated_index
+
+    Yields:
+        Target: targets still to be migrated
+    """
+    for target in targets:
+        if not is_migrated(target, index):
+            yield target
+        else:
+            output(f"Skipping target: {target.id} {target.display_name}, it has already been migrated", 'skipped')
+
+def is_migrated(target, index):
+    """Check whether the repository of a target already has a GitHub App target
+
+    Repositories are matched on their URL when both targets have one, as repositories on different
+    GitHub hosts can share a display name. The display name is only compared when a URL is missing.
+
+    Args:
+        target (Target): Snyk target
+        index (dict): Repository URLs and names built by get_migrated_index
+
+    Returns:
+        bool: True when the repository has already been migrated
+    """
+    url = repository_url(target)
+    name = (target.display_name or '').lower()
+
+    if url:
+        return url in index['urls'] or name in index['names_without_url']
+
+    return bool(name) and name in index['names']
+
+def repository_url(target):
+    """Normalised repository URL of a target, whatever integration imported it
+
+    Args:
+        target (Target): Snyk target
+
+    Returns:
+        str: lower case URL without a trailing slash or .git suffix, empty when the target has no URL
+    """
+    return target.url.lower().rstrip('/').removesuffix('.git')
+
+def iter_targets(snyk_token, org_id, origin='github-enterprise', tenant='', session=requests):
+    """Generator yielding the targets in an org one at a time, fetching a page whenever the previous one is used up
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origin (str, optional): Filter to retrieve targets of a certain origin. Defaults to 'github-enterprise'.
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Yields:
+        Target: github targets in a snyk org
+    """
+    for page in get_target_pages(snyk_token, org_id, origin=origin, tenant=tenant, session=session):
+        yield from page
+
+def get_target_pages(snyk_token, org_id, origin='github-enterprise', tenant='', session=requests):
+    """Generator following the REST /targets cursor, yielding one page of targets at a time
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origin (str, optional): Filter to retrieve targets of a certain origin. Defaults to 'github-enterprise'.
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Yields:
+        list[Target]: github targets of a single page
+
+    Raises:
+        TargetListingError: when a page cannot be retrieved, rather than ending the listing early
+    """
+
+    headers = {
+        'Authorization': f'token {snyk_token}'
+    }
+
+    base_url = SNYK_REST_API_BASE_URL
+
+    if tenant == 'au':
+        base_url = SNYK_REST_API_BASE_URL_AU
+    if tenant == 'eu':
+        base_url = SNYK_REST_API_BASE_URL_EU
+
+    url = f'{base_url}/rest/orgs/{org_id}/targets?version={SNYK_REST_API_VERSION}&limit=100&source_types={origin}&exclude_empty=false'
+
+    while True:
+        try:
+            response = api_request(
+                session,
+                'GET',
+                url,
+                headers=headers,
+                timeout=SNYK_API_TIMEOUT_DEFAULT)
+        except requests.RequestException as exc:
+            raise TargetListingError(f"{origin} targets: {exc}") from exc
+
+        page, url = read_target_page(response, org_id, origin, base_url)
+
+        if page is not None:
+            yield page
+
+        if not url:
+            break
+
+def read_target_page(response, org_id, origin, base_url):
+    """Read the targets and the link to the next page from a page of the REST /targets endpoint
+
+    Args:
+        response (requests.Response): response from the REST API
+        org_id (str): Snyk Organization ID
+        origin (str): Origin the targets were listed with
+        base_url (str): REST API base URL the next link is relative to
+
+    Returns:
+        tuple: targets of the page, None when it has no data, and the URL of the next page, empty on the last page
+
+    Raises:
+        TargetListingError: when the page could not be retrieved
+    """
+    if response.status_code != 200:
+        raise TargetListingError(f"{origin} targets: {response.status_code}, request ID: {response.headers.get('snyk-request-id')}", response=response)
+
+    response_json = json.loads(response.content)
+    page = None
+
+    if 'data' in response_json:
+        if state["metrics"]:
+            state["metrics"].count_targets('listed', len(response_json['data']))
+
+        page = [Target.from_json(data, origin, org_id) for data in response_json['data']]
+
+    if 'next' not in response_json.get('links', {}) or response_json['links']['next'] == '':
+        return page, ''
+
+    return page, f"{base_url}/{response_json['links']['next']}"
+
+def iter_pipelined_targets(snyk_token, org_id, origins, tenant='', session=requests):
+    """Generator yielding targets of every origin while the following pages are still being listed
+
+    Each origin is listed by a background producer thread. Pages are handed over through a
+    bounded queue, so at most a few pages are held in memory and listing pauses whenever
+    migration falls behind.
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origins (list): Origins to retrieve targets for
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Yields:
+        Target: github targets in a snyk org, each target only once
+    """
+    seen = set()
+
+    for page in prefetch_pages([
+            get_target_pages(snyk_token, org_id, origin=origin, tenant=tenant, session=session)
+            for origin in origins]):
+        for target in page:
+            if target.id not in seen:
+                seen.add(target.id)
+                yield target
+
+def prefetch_pages(page_iterators, depth=SNYK_PIPELINE_DEPTH):
+    """Consume page iterators in background threads, yielding pages in the order they arrive
+
+    Args:
+        page_iterators (list): Iterators producing pages
+        depth (int, optional): Maximum number of pages waiting to be consumed
+
+    Yields:
+        list: pages produced by any of the iterators
+    """
+    pages = queue.Queue(maxsize=depth)
+    done = object()
+    stopped = threading.Event()
+
+    def offer(item):
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(page_iterator):
+        try:
+            for page in page_iterator:
+                if not offer(page):
+                    return
+        except Exception as exc: # pylint: disable=broad-exception-caught
+            offer(exc)
+        finally:
+            offer(done)
+
+    producers = [threading.Thread(target=in_context(produce), args=(page_iterator,), daemon=True) for page_iterator in page_iterators]
+
+    for producer in producers:
+        producer.start()
+
+    remaining = len(producers)
+
+    try:
+        while remaining:
+            page = pages.get()
+
+            if page is done:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        stopped.set()
+
+def get_target_count(snyk_token, org_id, origin='github-enterprise', tenant='', session=requests):
+    """Helper function to count the targets of an origin in an org
+
+    The REST API is first asked for the count alone, with a page of a single target. When the
+    response carries no count, the pages are walked without keeping any target.
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origin (str, optional): Filter to count targets of a certain origin. Defaults to 'github-enterprise'.
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Returns:
+        int: number of targets
+    """
+    headers = {
+        'Authorization': f'token {snyk_token}'
+    }
+
+    base_url = SNYK_REST_API_BASE_URL
+
+    if tenant == 'au':
+        base_url = SNYK_REST_API_BASE_URL_AU
+    if tenant == 'eu':
+        base_url = SNYK_REST_API_BASE_URL_EU
+
+    url = f'{base_url}/rest/orgs/{org_id}/targets?version={SNYK_REST_API_VERSION}&limit=1&count=true&source_types={origin}&exclude_empty=false'
+
+    response = api_request(
+        session,
+        'GET',
+        url,
+        headers=headers,
+        timeout=SNYK_API_TIMEOUT_DEFAULT)
+
+    if response.status_code == 200:
+        count = json.loads(response.content).get('meta', {}).get('count')
+
+        if isinstance(count, int):
+            return count
+
+    return sum(len(page) for page in get_target_pages(snyk_token, org_id, origin=origin, tenant=tenant, session=session))
+
+def migrate_target(snyk_token, org_id, target, source_type, tenant='', session=requests):
+    """Send the hidden API request that moves a single target to a GitHub App integration
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID, used when the target does not carry its own
+        target (Target): Target to be migrated
+        source_type (str): Integration the target is migrated to
+        tenant (str, optional): Snyk tenant
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Returns:
+        requests.Response: response from the hidden API
+    """
+
+    url, headers, body = migration_request(snyk_token, org_id, target, source_type, tenant=tenant)
+
+    with trace('target', **{'snyk.org_id': target.org_id or org_id, 'snyk.target_id': target.id, 'snyk.target_name': target.display_name}):
+        controller = state["concurrency_controller"]
+
+        if not controller:
+            return api_request(
+                session,
+                "PATCH",
+                url,
+                headers=headers,
+                data=body,
+                timeout=SNYK_API_TIMEOUT_DEFAULT)
+
+        controller.acquire()
+        start = time.monotonic()
+        latency = None
+        healthy = False
+
+        try:
+            response = api_request(
+                session,
+                "PATCH",
+                url,
+                headers=headers,
+                data=body,
+                timeout=SNYK_API_TIMEOUT_DEFAULT)
+            # elapsed leaves out the time spent waiting on the rate limiter
+            latency = response.elapsed.total_seconds()
+            healthy = healthy_migration(response)
+            return response
+        finally:
+            controller.release(time.monotonic() - start if latency is None else latency, healthy)
+
+def migration_request(snyk_token, org_id, target, source_type, tenant=''):
+    """Build the hidden API request that moves a single target to a GitHub App integration
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID, used when the target does not carry its own
+        target (Target): Target to be migrated
+        source_type (str): Integration the target is migrated to
+        tenant (str, optional): Snyk tenant
+
+    Returns:
+        tuple: URL, headers and JSON body of the request
+    """
+    base_url = SNYK_HIDDEN_API_BASE_URL
+
+    if tenant == 'au':
+        base_url = SNYK_HIDDEN_API_BASE_URL_AU
+    if tenant == 'eu':
+        base_url = SNYK_HIDDEN_API_BASE_URL_EU
+
+    headers = {
+        'Content-Type': 'application/vnd.api+json',
+        'Authorization': f'token {snyk_token}'
+    }
+
+    url = f"{base_url}/orgs/{target.org_id or org_id}/targets/{target.id}?version={SNYK_HIDDEN_API_VERSION}"
+
+    body = json.dumps({
+        "data": {
+            "id": f"{target.id}",
+            "attributes": {
+                "source_type": f"{source_type}"
+            }
+        }
+    })
+
+    return url, headers, body
+
+def healthy_migration(response):
+    """Whether a migration response should let the adaptive concurrency grow
+
+    Args:
+        response (requests.Response): response from the hidden API
+
+    Returns:
+        bool: False when the request was retried, throttled or hit a server error
+    """
+    # a 429 is only retried with more than one attempt, count it as throttled either way
+    return response.attempts == 1 and response.status_code != 429 and response.status_code < 500
+
+def api_request(session, method, url, **kwargs):
+    """Send a request to the Snyk API, as a client span when the run is traced
+
+    Args:
+        session (requests.Session): Session used to send the request
+        method (str): HTTP method
+        url (str): Request URL
+        **kwargs: Passed on to session.request
+
+    Returns:
+        requests.Response: response from the Snyk API, with the number of times it was sent as `attempts`
+
+    Raises:
+        requests.RequestException: when the request could not be sent on the last attempt
+    """
+    if not state["tracer"]:
+        return send_request(session, method, url, **kwargs)
+
+    with state["tracer"].span(endpoint_name(method, url), kind=3, **{'http.request.method': method, 'url.full': url}) as span:
+        response = send_request(session, method, url, **kwargs)
+        annotate_span(span, response)
+
+        return response
+
+def annotate_span(span, response):
+    """Add the outcome of a request to its client span
+
+    Args:
+        span (dict): client span of the request
+        response (requests.Response): response from the Snyk API
+    """
+    span['attributes'].update({
+        'http.response.status_code': response.status_code,
+        'http.request.resend_count': response.attempts - 1,
+        'snyk.request_id': response.headers.get('snyk-request-id', '')
+    })
+
+    if response.status_code >= 400:
+        span['status'] = {'code': 2}
+
+def send_request(session, method, url, **kwargs):
+    """Send a request to the Snyk API through the run's rate limiter, retrying transient failures
+
+    Throttled requests wait for the rate limiter, connection errors and other retryable
+    statuses back off according to the run's retry policy.
+
+    Args:
+        session (requests.Session): Session used to send the request
+        method (str): HTTP method
+        url (str): Request URL
+        **kwargs: Passed on to session.request
+
+    Returns:
+        requests.Response: response from the Snyk API, with the number of times it was sent as `attempts`
+
+    Raises:
+        requests.RequestException: when the request could not be sent on the last attempt
+    """
+    rate_limiter = state["rate_limiter"]
+    attempt = 0
+
+    while True:
+        attempt += 1
+
+        waited = rate_limiter.acquire() if rate_limiter else 0.0
+
+        if state["metrics"]:
+            state["metrics"].begin()
+
+        start = time.monotonic()
+
+        try:
+            response = session.request(method, url, **kwargs)
+        except requests.RequestException as exc:
+            delay = failure_retry_delay(method, url, exc, isinstance(exc, (requests.ConnectionError, requests.Timeout)), attempt, time.monotonic() - start, waited)
+
+            if delay is None:
+                raise
+        else:
+            delay = response_retry_delay(method, url, response, attempt, waited)
+
+            if delay is None:
+                response.attempts = attempt
+                return response
+
+        time.sleep(delay)
+
+def failure_retry_delay(method, url, exc, retryable, attempt, elapsed, waited):
+    """Record a request that could not be sent and decide whether to send it again
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+        exc (Exception): error raised by the HTTP client
+        retryable (bool): True for connection errors and timeouts
+        attempt (int): Number of the attempt that failed, starting at 1
+        elapsed (float): Seconds the attempt took
+        waited (float): Seconds the attempt waited for the rate limiter
+
+    Returns:
+        float: seconds to wait before the next attempt, None when the error is final
+    """
+    retry_policy = state["retry_policy"] or RetryPolicy()
+
+    if state["metrics"]:
+        state["metrics"].record(method, url, elapsed, retry=attempt > 1, waited=waited)
+
+    if not retryable or attempt >= retry_policy.max_attempts:
+        return None
+
+    delay = retry_policy.backoff(attempt)
+
+    if state["verbose"]:
+        output(f"Retrying {method} {url}, attempt {attempt + 1} of {retry_policy.max_attempts}, reason: {exc}")
+
+    return delay
+
+def response_retry_delay(method, url, response, attempt, waited):
+    """Record a response, let the rate limiter adjust to it and decide whether to send the request again
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+        response (requests.Response): response from the Snyk API
+        attempt (int): Number of the attempt the response answers, starting at 1
+        waited (float): Seconds the attempt waited for the rate limiter
+
+    Returns:
+        float: seconds to wait before the next attempt, None when the response is final
+    """
+    rate_limiter = state["rate_limiter"]
+    retry_policy = state["retry_policy"] or RetryPolicy()
+
+    if state["metrics"]:
+        state["metrics"].record(
+            method,
+            url,
+            response.elapsed.total_seconds(),
+            status=str(response.status_code),
+            size=len(response.content),
+            retry=attempt > 1,
+            waited=waited)
+
+    throttled = rate_limiter.update(response) if rate_limiter else response.status_code == 429
+
+    if response.status_code not in retry_policy.retryable_statuses or attempt >= retry_policy.max_attempts:
+        return None
+
+    if throttled and rate_limiter:
+        # the rate limiter already holds every caller back until Retry-After has passed
+        delay = 0
+    else:
+        delay = retry_after(response) or retry_policy.backoff(attempt)
+
+    if state["verbose"]:
+        output(f"Retrying {method} {url}, attempt {attempt + 1} of {retry_policy.max_attempts}, reason: {response.status_code}")
+
+    return delay
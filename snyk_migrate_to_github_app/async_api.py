@@ -0,0 +1,346 @@
+"""Requests to the Snyk APIs sent from an asyncio event loop through one pooled HTTP client
+"""
+
+# ===== IMPORTS =====
+
+import asyncio
+import json
+import time
+
+import httpx
+from rich import print
+
+from snyk_migrate_to_github_app.constants import SNYK_V1_API_BASE_URL, SNYK_V1_API_BASE_URL_AU, SNYK_V1_API_BASE_URL_EU, SNYK_REST_API_BASE_URL, SNYK_REST_API_BASE_URL_AU, SNYK_REST_API_BASE_URL_EU, SNYK_REST_API_VERSION, SNYK_API_TIMEOUT_DEFAULT, SNYK_POOL_HOSTS
+from snyk_migrate_to_github_app.state import state
+from snyk_migrate_to_github_app.metrics import endpoint_name
+from snyk_migrate_to_github_app.tracing import trace
+from snyk_migrate_to_github_app.api import TargetListingError, check_org_integrations, read_target_page, unique_targets, index_migrated, migration_request, healthy_migration, annotate_span, failure_retry_delay, response_retry_delay
+
+# ===== METHODS =====
+
+def create_async_client(pool_size):
+    """Create the HTTP client shared by every API call of an asyncio run
+
+    Like the session of a threaded run, the client keeps connections alive between requests,
+    so only the first request to each Snyk API host pays for the TLS handshake.
+
+    Args:
+        pool_size (int): Maximum number of connections kept alive per host
+
+    Returns:
+        httpx.AsyncClient: client with a connection pool for every Snyk API host
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=pool_size * SNYK_POOL_HOSTS, max_keepalive_connections=pool_size * SNYK_POOL_HOSTS),
+        timeout=SNYK_API_TIMEOUT_DEFAULT)
+
+async def get_group_orgs_async(client, snyk_token, group_id, tenant=''):
+    """Asyncio flavour of get_group_orgs
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        group_id (str): Snyk Group ID
+        tenant (str, optional): Snyk tenant
+
+    Returns:
+        list: (org ID, org name) of every organization in the group
+    """
+    orgs = []
+
+    headers = {
+        'Authorization': f'token {snyk_token}'
+    }
+
+    base_url = SNYK_REST_API_BASE_URL
+
+    if tenant == 'au':
+        base_url = SNYK_REST_API_BASE_URL_AU
+    if tenant == 'eu':
+        base_url = SNYK_REST_API_BASE_URL_EU
+
+    url = f'{base_url}/rest/groups/{group_id}/orgs?version={SNYK_REST_API_VERSION}&limit=100'
+
+    while True:
+        try:
+            response = await api_request_async(
+                client,
+                'GET',
+                url,
+                headers=headers,
+                timeout=SNYK_API_TIMEOUT_DEFAULT)
+        except httpx.HTTPError as exc:
+            print(f"Unable to retrieve organizations for Snyk group: {group_id}, reason: {exc}")
+            return []
+
+        if response.status_code != 200:
+            print(f"Unable to retrieve organizations for Snyk group: {group_id}, reason: {response.status_code}")
+            return []
+
+        response_json = json.loads(response.content)
+
+        for org in response_json.get('data', []):
+            orgs.append((org['id'], org.get('attributes', {}).get('name', '')))
+
+        if 'next' not in response_json.get('links', {}) or response_json['links']['next'] == '':
+            break
+        url = f"{base_url}/{response_json['links']['next']}"
+
+    return orgs
+
+async def verify_org_integrations_async(client, snyk_token, org_id, github_server_app=False, tenant=''):
+    """Asyncio flavour of verify_org_integrations
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        tenant (str, optional): Snyk tenant
+
+    Returns:
+        bool: True when the org has the required integrations
+    """
+    headers = {
+        'Authorization': f'token {snyk_token}'
+    }
+
+    base_url = SNYK_V1_API_BASE_URL
+
+    if tenant == 'au':
+        base_url = SNYK_V1_API_BASE_URL_AU
+    if tenant == 'eu':
+        base_url = SNYK_V1_API_BASE_URL_EU
+
+    url = f"{base_url}/org/{org_id}/integrations"
+
+    try:
+        response = await api_request_async(
+            client,
+            'GET',
+            url,
+            headers=headers,
+            timeout=SNYK_API_TIMEOUT_DEFAULT)
+    except httpx.TransportError:
+        print(f"Unable to connect to {base_url}")
+        return False
+
+    return check_org_integrations(org_id, response, github_server_app=github_server_app)
+
+async def get_target_pages_async(client, snyk_token, org_id, origin='github-enterprise', tenant=''):
+    """Asyncio flavour of get_target_pages, yielding the targets of an org a page at a time
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origin (str, optional): Filter to retrieve targets of a certain origin. Defaults to 'github-enterprise'.
+        tenant (str, optional): Snyk tenant
+
+    Yields:
+        list[Target]: github targets in a snyk org, one page at a time
+
+    Raises:
+        TargetListingError: when a page could not be retrieved, so the listing would be incomplete
+    """
+    headers = {
+        'Authorization': f'token {snyk_token}'
+    }
+
+    base_url = SNYK_REST_API_BASE_URL
+
+    if tenant == 'au':
+        base_url = SNYK_REST_API_BASE_URL_AU
+    if tenant == 'eu':
+        base_url = SNYK_REST_API_BASE_URL_EU
+
+    url = f'{base_url}/rest/orgs/{org_id}/targets?version={SNYK_REST_API_VERSION}&limit=100&source_types={origin}&exclude_empty=false'
+
+    while url:
+        try:
+            response = await api_request_async(
+                client,
+                'GET',
+                url,
+                headers=headers,
+                timeout=SNYK_API_TIMEOUT_DEFAULT)
+        except httpx.HTTPError as exc:
+            raise TargetListingError(f"{origin} targets: {exc}") from exc
+
+        page, url = read_target_page(response, org_id, origin, base_url)
+
+        if page is not None:
+            yield page
+
+async def get_all_targets_async(client, snyk_token, org_id, origin='github-enterprise', tenant=''):
+    """Asyncio flavour of get_all_targets
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origin (str, optional): Filter to retrieve targets of a certain origin. Defaults to 'github-enterprise'.
+        tenant (str, optional): Snyk tenant
+
+    Returns:
+        list[Target]: github targets in a snyk org
+    """
+    return [target async for page in get_target_pages_async(client, snyk_token, org_id, origin=origin, tenant=tenant) for target in page]
+
+async def get_targets_for_origins_async(client, snyk_token, org_id, origins, tenant=''):
+    """Asyncio flavour of get_targets_for_origins, listing every origin concurrently
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origins (list): Origins to retrieve targets for
+        tenant (str, optional): Snyk tenant
+
+    Returns:
+        list[Target]: github targets in a snyk org, each target only once
+    """
+    origin_targets = await asyncio.gather(*(
+        get_all_targets_async(client, snyk_token, org_id, origin=origin, tenant=tenant)
+        for origin in origins))
+
+    return unique_targets(target for targets in origin_targets for target in targets)
+
+async def get_migrated_index_async(client, snyk_token, org_id, github_server_app=False, tenant=''):
+    """Asyncio flavour of get_migrated_index
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        tenant (str, optional): Snyk tenant
+
+    Returns:
+        dict: repository URLs of the targets already using the GitHub App integration, their display names,
+            and the display names of those without a URL
+    """
+    source_type = 'github-cloud-app'
+
+    if github_server_app:
+        source_type = 'github-server-app'
+
+    return index_migrated(await get_all_targets_async(client, snyk_token, org_id, origin=source_type, tenant=tenant))
+
+async def migrate_target_async(client, snyk_token, org_id, target, source_type, tenant=''):
+    """Asyncio flavour of migrate_target
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID, used when the target does not carry its own
+        target (Target): Target to be migrated
+        source_type (str): Integration the target is migrated to
+        tenant (str, optional): Snyk tenant
+
+    Returns:
+        httpx.Response: response from the hidden API
+    """
+    url, headers, body = migration_request(snyk_token, org_id, target, source_type, tenant=tenant)
+
+    with trace('target', **{'snyk.org_id': target.org_id or org_id, 'snyk.target_id': target.id, 'snyk.target_name': target.display_name}):
+        controller = state["concurrency_controller"]
+
+        if not controller:
+            return await api_request_async(
+                client,
+                "PATCH",
+                url,
+                headers=headers,
+                content=body,
+                timeout=SNYK_API_TIMEOUT_DEFAULT)
+
+        await controller.acquire_async()
+        start = time.monotonic()
+        latency = None
+        healthy = False
+
+        try:
+            response = await api_request_async(
+                client,
+                "PATCH",
+                url,
+                headers=headers,
+                content=body,
+                timeout=SNYK_API_TIMEOUT_DEFAULT)
+            # elapsed leaves out the time spent waiting on the rate limiter
+            latency = response.elapsed.total_seconds()
+            healthy = healthy_migration(response)
+            return response
+        finally:
+            controller.release(time.monotonic() - start if latency is None else latency, healthy)
+
+async def api_request_async(client, method, url, **kwargs):
+    """Asyncio flavour of api_request, sending a request as a client span when the run is traced
+
+    Args:
+        client (httpx.AsyncClient): Client used to send the request
+        method (str): HTTP method
+        url (str): Request URL
+        **kwargs: Passed on to client.request
+
+    Returns:
+        httpx.Response: response from the Snyk API, with the number of times it was sent as `attempts`
+
+    Raises:
+        httpx.HTTPError: when the request could not be sent on the last attempt
+    """
+    if not state["tracer"]:
+        return await send_request_async(client, method, url, **kwargs)
+
+    with state["tracer"].span(endpoint_name(method, url), kind=3, **{'http.request.method': method, 'url.full': url}) as span:
+        response = await send_request_async(client, method, url, **kwargs)
+        annotate_span(span, response)
+
+        return response
+
+async def send_request_async(client, method, url, **kwargs):
+    """Asyncio flavour of send_request, waiting for the rate limiter and between retries without blocking the event loop
+
+    Args:
+        client (httpx.AsyncClient): Client used to send the request
+        method (str): HTTP method
+        url (str): Request URL
+        **kwargs: Passed on to client.request
+
+    Returns:
+        httpx.Response: response from the Snyk API, with the number of times it was sent as `attempts`
+
+    Raises:
+        httpx.HTTPError: when the request could not be sent on the last attempt
+    """
+    rate_limiter = state["rate_limiter"]
+    attempt = 0
+
+    while True:
+        attempt += 1
+
+        waited = await rate_limiter.acquire_async() if rate_limiter else 0.0
+
+        if state["metrics"]:
+            state["metrics"].begin()
+
+        start = time.monotonic()
+
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as exc:
+            # a kept-alive connection closed by the server surfaces as a protocol error
+            retryable = isinstance(exc, (httpx.NetworkError, httpx.TimeoutException, httpx.RemoteProtocolError))
+            delay = failure_retry_delay(method, url, exc, retryable, attempt, time.monotonic() - start, waited)
+
+            if delay is None:
+                raise
+        else:
+            delay = response_retry_delay(method, url, response, attempt, waited)
+
+            if delay is None:
+                response.attempts = attempt
+                return response
+
+        await asyncio.sleep(delay)
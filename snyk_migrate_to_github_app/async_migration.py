@@ -0,0 +1,276 @@
+"""Verifying, listing and migrating targets from an asyncio event loop, on a single thread
+"""
+
+# ===== IMPORTS =====
+
+import asyncio
+from collections import deque
+
+import httpx
+import requests
+from rich import print
+
+from snyk_migrate_to_github_app.constants import SNYK_CONCURRENCY_DEFAULT, SNYK_ORG_CONCURRENCY_DEFAULT
+from snyk_migrate_to_github_app.state import state, output
+from snyk_migrate_to_github_app.reporting import MigrationSummary
+from snyk_migrate_to_github_app.tracing import trace
+from snyk_migrate_to_github_app.sharding import shard_orgs
+from snyk_migrate_to_github_app.api import exclude_migrated
+from snyk_migrate_to_github_app.async_api import create_async_client, get_group_orgs_async, verify_org_integrations_async, get_targets_for_origins_async, get_migrated_index_async, migrate_target_async
+from snyk_migrate_to_github_app.migration import dry_run_targets, report_migration_result, filter_targets
+
+# ===== METHODS =====
+
+async def migrate_org_async(snyk_token, org_id, origins, tenant='', dry_run=False, github_server_app=False, concurrency=SNYK_CONCURRENCY_DEFAULT, pool_size=0, skip_migrated=False):
+    """Asyncio flavour of migrate_org, verifying, listing and migrating through one pooled client
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origins (list): Origins of the targets to migrate
+        tenant (str, optional): Snyk tenant
+        dry_run (bool, optional): Only print the targets that would be migrated
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        concurrency (int, optional): Number of targets to migrate concurrently. Defaults to 1.
+        pool_size (int, optional): Connections kept alive per host, defaults to concurrency + 1
+        skip_migrated (bool, optional): Leave out targets whose repository already has a GitHub App target
+
+    Returns:
+        bool: False when the org does not have the required integrations
+
+    Raises:
+        TargetListingError: when the targets of the org cannot all be listed
+    """
+    async with create_async_client(pool_size or concurrency + 1) as client:
+        with trace('org', **{'snyk.org_id': org_id}):
+            with trace('verify'):
+                verified = await verify_org_integrations_async(client, snyk_token, org_id, github_server_app=github_server_app, tenant=tenant)
+
+            if state["profiler"]:
+                state["profiler"].phase(f"verifying {org_id}")
+
+            if not verified:
+                return False
+
+            with trace('list'):
+                targets = filter_targets(await get_targets_for_origins_async(client, snyk_token, org_id, origins, tenant=tenant))
+
+                if skip_migrated:
+                    targets = exclude_migrated(targets, await get_migrated_index_async(client, snyk_token, org_id, github_server_app=github_server_app, tenant=tenant))
+
+            if state["profiler"]:
+                state["profiler"].phase(f"listing {org_id}")
+
+            if state["summary"]:
+                targets = state["summary"].count_listed(org_id, targets)
+
+            with trace('dry run' if dry_run else 'migrate'):
+                if (dry_run):
+                    dry_run_targets(targets)
+                else:
+                    await migrate_targets_async(client, snyk_token, org_id, targets, github_server_app=github_server_app, tenant=tenant, concurrency=concurrency)
+
+            if state["profiler"]:
+                state["profiler"].phase(f"migrating {org_id}")
+
+    return True
+
+async def migrate_group_async(snyk_token, group_id, origins, tenant='', dry_run=False, github_server_app=False, concurrency=SNYK_CONCURRENCY_DEFAULT, org_concurrency=SNYK_ORG_CONCURRENCY_DEFAULT, pool_size=0, skip_migrated=False):
+    """Asyncio flavour of migrate_group
+
+    Orgs are verified and listed concurrently, at most `org_concurrency` at a time, and join a
+    single round-robin stream of targets as soon as their listing completes.
+
+    Args:
+        snyk_token (str): Snyk API token
+        group_id (str): Snyk Group ID
+        origins (list): Origins of the targets to migrate
+        tenant (str, optional): Snyk tenant
+        dry_run (bool, optional): Only print the targets that would be migrated
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        concurrency (int, optional): Number of targets to migrate concurrently across the group. Defaults to 1.
+        org_concurrency (int, optional): Number of orgs verified and listed concurrently
+        pool_size (int, optional): Connections kept alive per host, defaults to concurrency + org_concurrency
+        skip_migrated (bool, optional): Leave out targets whose repository already has a GitHub App target
+    """
+    summary = MigrationSummary()
+    state["summary"] = summary
+
+    async with create_async_client(pool_size or concurrency + org_concurrency) as client:
+        orgs = shard_orgs(await get_group_orgs_async(client, snyk_token, group_id, tenant=tenant), state["shard"])
+
+        if state["profiler"]:
+            state["profiler"].phase(f"listing the orgs of {group_id}")
+
+        if not orgs:
+            return
+
+        for org_id, name in orgs:
+            summary.add_org(org_id, name)
+
+        semaphore = asyncio.Semaphore(org_concurrency)
+
+        async def list_org(org_id, name):
+            # a failing org must not take the listing task, and with it the whole group, down
+            async with semaphore:
+                try:
+                    with trace('org', **{'snyk.org_id': org_id, 'snyk.org_name': name}):
+                        targets = await list_org_targets_async(client, snyk_token, org_id, origins, tenant=tenant, github_server_app=github_server_app, skip_migrated=skip_migrated)
+                except (requests.RequestException, httpx.HTTPError, ValueError) as exc:
+                    output(f"Unable to list targets for Snyk org: {org_id}, reason: {exc}")
+                    summary.add_org(org_id, name, status=f'error: {exc}')
+                    return []
+
+            if targets is None:
+                summary.add_org(org_id, name, status='not verified')
+                return []
+
+            summary.add_org(org_id, name, listed=len(targets))
+            return targets
+
+        with trace('dry run' if dry_run else 'migrate'):
+            targets = round_robin_async([asyncio.create_task(list_org(org_id, name)) for org_id, name in orgs])
+
+            if (dry_run):
+                dry_run_targets([target async for target in targets])
+            else:
+                await migrate_targets_async(client, snyk_token, None, targets, github_server_app=github_server_app, tenant=tenant, concurrency=concurrency)
+
+        if state["profiler"]:
+            state["profiler"].phase(f"migrating the orgs of {group_id}")
+
+    if state["console"]:
+        state["console"].flush()
+
+    print()
+    summary.print()
+
+async def list_org_targets_async(client, snyk_token, org_id, origins, tenant='', github_server_app=False, skip_migrated=False):
+    """Asyncio flavour of list_org_targets
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origins (list): Origins of the targets to migrate
+        tenant (str, optional): Snyk tenant
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        skip_migrated (bool, optional): Leave out targets whose repository already has a GitHub App target
+
+    Returns:
+        list[Target]: targets to migrate, None when the org does not have the required integrations
+
+    Raises:
+        TargetListingError: when the targets of the org cannot all be listed
+    """
+    with trace('verify'):
+        verified = await verify_org_integrations_async(client, snyk_token, org_id, github_server_app=github_server_app, tenant=tenant)
+
+    if not verified:
+        return None
+
+    with trace('list'):
+        targets = filter_targets(await get_targets_for_origins_async(client, snyk_token, org_id, origins, tenant=tenant))
+
+        if skip_migrated:
+            targets = exclude_migrated(targets, await get_migrated_index_async(client, snyk_token, org_id, github_server_app=github_server_app, tenant=tenant))
+
+        return list(targets)
+
+async def round_robin_async(tasks):
+    """Asyncio flavour of round_robin, orgs join once their listing task completes
+
+    Args:
+        tasks (list): Tasks resolving to the targets of one org each
+
+    Yields:
+        Target: targets of all orgs, interleaved
+    """
+    pending = set(tasks)
+    active = deque()
+
+    while pending or active:
+        done = {task for task in pending if task.done()}
+
+        if not done and not active:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+        for task in done:
+            pending.discard(task)
+            active.append(iter(task.result()))
+
+        if not active:
+            continue
+
+        targets = active.popleft()
+        target = next(targets, None)
+
+        if target is not None:
+            yield target
+            active.append(targets)
+
+async def migrate_targets_async(client, snyk_token, org_id, targets, github_server_app=False, tenant='', concurrency=SNYK_CONCURRENCY_DEFAULT):
+    """Asyncio flavour of migrate_targets, at most `concurrency` requests are in flight at once
+
+    Args:
+        client (httpx.AsyncClient): Client used to send requests
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        targets (iterable): Targets to be migrated, an iterable or an async iterable
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        tenant (str, optional): Snyk tenant
+        concurrency (int, optional): Number of targets to migrate concurrently. Defaults to 1.
+    """
+
+    source_type = 'github-cloud-app'
+
+    if github_server_app:
+        source_type = 'github-server-app'
+
+    semaphore = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def migrate(target):
+        try:
+            response = await migrate_target_async(client, snyk_token, org_id, target, source_type, tenant=tenant)
+        except httpx.HTTPError as exc:
+            report_migration_result(target, source_type, error=exc)
+        else:
+            report_migration_result(target, source_type, response)
+        finally:
+            semaphore.release()
+
+    progress = state["progress"]
+
+    if progress:
+        progress.expect(targets)
+
+    try:
+        async for target in iterate(targets):
+            await semaphore.acquire()
+
+            if progress:
+                progress.submit()
+
+            task = asyncio.create_task(migrate(target))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        # when listing fails halfway, the targets already sent are still reported and journaled
+        await asyncio.gather(*tasks)
+
+async def iterate(targets):
+    """Iterate over targets given as an iterable or an async iterable
+
+    Args:
+        targets (iterable): Targets, or an async iterable of targets
+
+    Yields:
+        Target: the same targets
+    """
+    if hasattr(targets, '__aiter__'):
+        async for target in targets:
+            yield target
+    else:
+        for target in targets:
+            yield target
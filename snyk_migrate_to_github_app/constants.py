@@ -0,0 +1,50 @@
+"""Constants shared by the modules of the CLI Tool
+"""
+
+# ===== CONSTANTS =====
+
+SNYK_V1_API_BASE_URL        = 'https://snyk.io/api/v1'
+SNYK_V1_API_BASE_URL_AU     = 'https://api.au.snyk.io/v1'
+SNYK_V1_API_BASE_URL_EU     = 'https://api.eu.snyk.io/v1/'
+SNYK_REST_API_BASE_URL      = 'https://api.snyk.io'
+SNYK_REST_API_BASE_URL_AU   = 'https://api.au.snyk.io'
+SNYK_REST_API_BASE_URL_EU   = 'https://api.eu.snyk.io'
+SNYK_REST_API_VERSION       = '2024-08-25'
+SNYK_HIDDEN_API_BASE_URL    = 'https://api.snyk.io/hidden'
+SNYK_HIDDEN_API_BASE_URL_AU = 'https://api.au.snyk.io/hidden'
+SNYK_HIDDEN_API_BASE_URL_EU = 'https://api.eu.snyk.io/hidden'
+SNYK_HIDDEN_API_VERSION     = '2023-04-02~experimental'
+SNYK_API_TIMEOUT_DEFAULT    = 90
+SNYK_CONCURRENCY_DEFAULT    = 1
+SNYK_POOL_HOSTS             = 4
+SNYK_PIPELINE_DEPTH         = 4
+SNYK_ORG_CONCURRENCY_DEFAULT = 4
+SNYK_QUEUE_LEASE_TIMEOUT    = 300   # seconds before a leased target is handed to another worker
+SNYK_QUEUE_DB_TIMEOUT       = 30    # seconds a worker waits for the queue database to be unlocked
+SNYK_CONSOLE_FLUSH_INTERVAL = 0.5   # seconds between two batches of buffered console output
+SNYK_CONSOLE_SUMMARY_INTERVAL = 10  # seconds between two progress lines in summary console output
+SNYK_PROGRESS_REFRESH       = 2     # progress display refreshes per second
+SNYK_PROGRESS_WINDOW        = 30    # seconds of completions the request rate is measured over
+SNYK_PROGRESS_LATENCIES     = 1000  # most recent latencies the percentiles are taken from
+SNYK_METRICS_TEXTFILE_INTERVAL = 15  # seconds between two writes of the metrics textfile
+SNYK_PROFILE_TOP            = 20    # functions printed from the CPU profile
+SNYK_PROFILE_ALLOCATIONS    = 5     # source lines listed per memory snapshot
+SNYK_TRACE_BATCH            = 512   # spans buffered before they are appended to the trace file
+SNYK_LATENCY_BUCKETS        = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 90)  # seconds
+SNYK_RATE_LIMIT_DEFAULT     = 25    # requests per second, Snyk allows 1620 requests per minute per token
+SNYK_RATE_LIMIT_FLOOR       = 1
+SNYK_RATE_LIMIT_RECOVERY    = 0.05  # share of the lost rate regained after every successful response
+SNYK_RATE_LIMIT_COOLDOWN    = 1     # seconds, minimum time between two decreases of the rate
+SNYK_RATE_LIMIT_PAUSE_MAX   = 60    # seconds, longest pause taken from Retry-After or the rate-limit reset headers
+SNYK_RATE_LIMIT_EPOCH       = 10**9 # reset values above this are Unix timestamps rather than seconds
+SNYK_RETRY_ATTEMPTS         = 5
+SNYK_RETRY_BACKOFF_BASE     = 1     # seconds
+SNYK_RETRY_BACKOFF_MAX      = 30    # seconds
+SNYK_RETRY_STATUSES         = frozenset({429, 500, 502, 503, 504})
+SNYK_JOURNAL_SYNC_EVERY     = 100   # records written between two fsyncs
+SNYK_JOURNAL_SYNC_INTERVAL  = 5     # seconds, longest time a record waits for an fsync
+SNYK_AIMD_START             = 4
+SNYK_AIMD_DECREASE          = 0.5
+SNYK_AIMD_LATENCY_FACTOR    = 2     # latency this many times the best seen counts as congestion
+SNYK_AIMD_SMOOTHING         = 0.2
+SNYK_AIMD_COOLDOWN          = 1     # seconds, minimum time between two decreases
@@ -0,0 +1,98 @@
+"""Checkpoint journal recording the outcome of every target migration
+"""
+
+# ===== IMPORTS =====
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from snyk_migrate_to_github_app.constants import SNYK_JOURNAL_SYNC_EVERY, SNYK_JOURNAL_SYNC_INTERVAL
+
+# ===== CLASSES =====
+
+class Journal:
+    """Append-only checkpoint file recording the outcome of every target migration
+
+    Each line is a JSON object with the target ID, its outcome and a timestamp. Lines reach the
+    operating system as they are written, so a killed process loses nothing, while fsyncs are
+    batched; a machine crash loses at most the last batch, and those targets are simply
+    migrated again on resume.
+    """
+
+    def __init__(self, path, resume=False):
+        """
+        Args:
+            path (str): Journal file, created when missing
+            resume (bool, optional): Load the targets already completed by an earlier run
+        """
+        self.completed = self.load(path) if resume else set()
+        self.file = open(path, 'a', encoding='utf-8', buffering=1) # pylint: disable=consider-using-with
+        self.pending = 0
+        self.synced = time.monotonic()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def load(path):
+        """Read the IDs of targets that need no further migration from a journal
+
+        Args:
+            path (str): Journal file
+
+        Returns:
+            set: IDs of targets that were migrated or found already migrated
+        """
+        completed = set()
+
+        if not os.path.exists(path):
+            return completed
+
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line can be cut short when the process was killed
+                    continue
+
+                if record.get('outcome') in ('migrated', 'already_migrated'):
+                    completed.add(record['target_id'])
+
+        return completed
+
+    def record(self, target, outcome):
+        """Append the outcome of a target migration
+
+        Args:
+            target (Target): Target that was migrated
+            outcome (str): 'migrated', 'already_migrated' or 'failed'
+        """
+        line = json.dumps({
+            'target_id': target.id,
+            'outcome': outcome,
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        })
+
+        with self.lock:
+            self.file.write(line + '\n')
+            self.pending += 1
+
+            if self.pending >= SNYK_JOURNAL_SYNC_EVERY or time.monotonic() - self.synced >= SNYK_JOURNAL_SYNC_INTERVAL:
+                self.sync()
+
+    def sync(self):
+        """Flush buffered records to disk, callers hold the lock
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.synced = time.monotonic()
+
+    def close(self):
+        """Flush the remaining records and close the journal
+        """
+        with self.lock:
+            self.sync()
+            self.file.close()
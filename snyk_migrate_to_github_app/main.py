@@ -2,33 +2,42 @@
 """
 
 # ===== IMPORTS =====
-
+import asyncio
 import json
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from functools import partial
+from typing import Tuple
 
+import httpx
 import requests
+import rich
 import typer
 from rich import print
+from rich.live import Live
+from rich.table import Table
 from typing_extensions import Annotated
 
-# ===== CONSTANTS =====
-
-SNYK_V1_API_BASE_URL        = 'https://snyk.io/api/v1'
-SNYK_V1_API_BASE_URL_AU     = 'https://api.au.snyk.io/v1'
-SNYK_V1_API_BASE_URL_EU     = 'https://api.eu.snyk.io/v1/'
-SNYK_REST_API_BASE_URL      = 'https://api.snyk.io'
-SNYK_REST_API_BASE_URL_AU   = 'https://api.au.snyk.io'
-SNYK_REST_API_BASE_URL_EU   = 'https://api.eu.snyk.io'
-SNYK_REST_API_VERSION       = '2024-08-25'
-SNYK_HIDDEN_API_BASE_URL    = 'https://api.snyk.io/hidden'
-SNYK_HIDDEN_API_BASE_URL_AU = 'https://api.au.snyk.io/hidden'
-SNYK_HIDDEN_API_BASE_URL_EU = 'https://api.eu.snyk.io/hidden'
-SNYK_HIDDEN_API_VERSION     = '2023-04-02~experimental'
-SNYK_API_TIMEOUT_DEFAULT    = 90
+from snyk_migrate_to_github_app.constants import SNYK_CONCURRENCY_DEFAULT, SNYK_POOL_HOSTS, SNYK_ORG_CONCURRENCY_DEFAULT, SNYK_PROGRESS_REFRESH, SNYK_METRICS_TEXTFILE_INTERVAL, SNYK_RATE_LIMIT_DEFAULT, SNYK_RETRY_ATTEMPTS
+from snyk_migrate_to_github_app.state import state, output
+from snyk_migrate_to_github_app.throttling import RetryPolicy, RateLimiter, ConcurrencyController
+from snyk_migrate_to_github_app.journal import Journal
+from snyk_migrate_to_github_app.reporting import MigrationSummary, ConsoleWriter, MigrationProgress, ResultStream
+from snyk_migrate_to_github_app.metrics import RequestMetrics, MetricsTextfile
+from snyk_migrate_to_github_app.tracing import Tracer, trace, in_context
+from snyk_migrate_to_github_app.profiling import Profiler
+from snyk_migrate_to_github_app.plan import MigrationPlan
+from snyk_migrate_to_github_app.work_queue import WorkQueue
+from snyk_migrate_to_github_app.sharding import parse_shard, shard_orgs
+from snyk_migrate_to_github_app.api import TargetListingError, get_group_orgs, create_session, verify_org_integrations, get_targets_for_origins, get_migrated_index, exclude_migrated, iter_pipelined_targets, get_target_count
+from snyk_migrate_to_github_app.migration import list_org_targets, round_robin, dry_run_targets, migrate_targets, filter_targets
+from snyk_migrate_to_github_app.async_api import create_async_client
+from snyk_migrate_to_github_app.async_migration import migrate_org_async, migrate_group_async, migrate_targets_async
 
 # ===== GLOBALS =====
 
 app = typer.Typer(add_completion=False)
-state = {"verbose": False}
 
 # ===== METHODS =====
 
@@ -38,7 +47,7 @@ def main(
         Annotated[
             str,
             typer.Argument(
-                help='ID of Organization in Snyk you wish to migrate targets to GitHub App',
+                help='ID of Organization in Snyk you wish to migrate targets to GitHub App, or ID of the Group with --group',
                 envvar='SNYK_ORG_ID')],
     snyk_token:
         Annotated[
@@ -66,6 +75,168 @@ def main(
             bool,
             typer.Option(
                 help="Migrate to github-server-app, Defaults to False (github-cloud-app)")] = False,
+    group:
+        Annotated[
+            bool,
+            typer.Option(
+                help='Treat ORG_ID as the ID of a Snyk Group and migrate the targets of every Organization in it')] = False,
+    processes:
+        Annotated[
+            int,
+            typer.Option(
+                min=1,
+                help='Number of worker processes Organizations are shared between with --group')] = 1,
+    org_concurrency:
+        Annotated[
+            int,
+            typer.Option(
+                min=1,
+                help='Number of Organizations verified and listed in parallel with --group')] = SNYK_ORG_CONCURRENCY_DEFAULT,
+    concurrency:
+        Annotated[
+            int,
+            typer.Option(
+                min=1,
+                help='Number of targets to migrate in parallel, the upper bound with --adaptive-concurrency')] = SNYK_CONCURRENCY_DEFAULT,
+    adaptive_concurrency:
+        Annotated[
+            bool,
+            typer.Option(
+                help='Tune the number of parallel migrations to the latency and error rate of the Snyk API')] = False,
+    use_asyncio:
+        Annotated[
+            bool,
+            typer.Option(
+                '--asyncio',
+                help='Verify, list and migrate from a single-threaded asyncio event loop sharing one pooled HTTP client')] = False,
+    pool_size:
+        Annotated[
+            int,
+            typer.Option(
+                min=0,
+                help='Maximum number of kept-alive connections per Snyk API host, defaults to concurrency + 1')] = 0,
+    pipeline:
+        Annotated[
+            bool,
+            typer.Option(
+                help='Start migrating each page of targets as soon as it is listed instead of listing everything first')] = False,
+    rate_limit:
+        Annotated[
+            float,
+            typer.Option(
+                min=0,
+                help='Maximum Snyk API requests per second, automatically lowered when the API responds with 429. 0 disables the limit')] = SNYK_RATE_LIMIT_DEFAULT,
+    max_attempts:
+        Annotated[
+            int,
+            typer.Option(
+                min=1,
+                help='Number of times a request is sent before a throttled, server error or connection failure is reported')] = SNYK_RETRY_ATTEMPTS,
+    skip_migrated:
+        Annotated[
+            bool,
+            typer.Option(
+                help='List the GitHub App targets first and skip targets whose repository has already been migrated')] = False,
+    journal:
+        Annotated[
+            str,
+            typer.Option(
+                help='Append the outcome of every migrated target to this checkpoint file')] = "",
+    resume:
+        Annotated[
+            bool,
+            typer.Option(
+                help='Skip targets the --journal file records as migrated by an earlier run')] = False,
+    count_only:
+        Annotated[
+            bool,
+            typer.Option(
+                help='Only print the number of targets to migrate per origin and Organization')] = False,
+    plan_out:
+        Annotated[
+            str,
+            typer.Option(
+                help='Dry run that also writes the targets to migrate to this plan file, to be executed later with --apply')] = "",
+    apply:
+        Annotated[
+            str,
+            typer.Option(
+                help='Migrate the targets of a plan written by --plan-out, without verifying or listing again')] = "",
+    queue_path:
+        Annotated[
+            str,
+            typer.Option(
+                '--queue',
+                help='Queue the targets in this SQLite file and migrate them from --queue-workers processes leasing batches of targets')] = "",
+    queue_workers:
+        Annotated[
+            int,
+            typer.Option(
+                min=1,
+                help='Number of worker processes working the --queue')] = 1,
+    enqueue:
+        Annotated[
+            bool,
+            typer.Option(
+                help='List and enqueue targets before working the --queue, disable to join a queue filled by another run')] = True,
+    retry_failed:
+        Annotated[
+            bool,
+            typer.Option(
+                help='Queue the targets of the --queue that failed in an earlier run again')] = False,
+    shard:
+        Annotated[
+            str,
+            typer.Option(
+                help="Only migrate this run's slice of the targets, as INDEX/COUNT, e.g. 0/4 on the first of four machines")] = "",
+    shard_by:
+        Annotated[
+            str,
+            typer.Option(
+                help="Split the slices by 'target' or, with --group, by 'org'")] = "target",
+    console_output:
+        Annotated[
+            str,
+            typer.Option(
+                help="How per-target results are printed: 'rich', 'buffered' (plain text written in batches from a background thread) or 'summary' (periodic counts only)")] = "rich",
+    show_progress:
+        Annotated[
+            bool,
+            typer.Option(
+                '--progress',
+                help='Show a live progress display with counts, request rate, latency and ETA')] = False,
+    metrics_json:
+        Annotated[
+            str,
+            typer.Option(
+                help='Also save the per-endpoint request statistics to this JSON file')] = "",
+    metrics_textfile:
+        Annotated[
+            str,
+            typer.Option(
+                help=f'Write request and target metrics in the Prometheus text format to this file every {SNYK_METRICS_TEXTFILE_INTERVAL} seconds, for the node_exporter textfile collector')] = "",
+    trace_output:
+        Annotated[
+            str,
+            typer.Option(
+                '--trace',
+                help='Record spans for every phase, target and API request to this file as OTLP JSON')] = "",
+    result_output:
+        Annotated[
+            Tuple[str, str],
+            typer.Option(
+                '--output',
+                help="Stream one record per target to a file as it completes, as FORMAT FILE, e.g. --output jsonl results.jsonl")] = ('', ''),
+    profile:
+        Annotated[
+            str,
+            typer.Option(
+                help='Profile the run with cProfile and save the statistics to this pstats file')] = "",
+    profile_memory:
+        Annotated[
+            bool,
+            typer.Option(
+                help='Trace memory allocations and print the largest ones after verifying, listing and migrating')] = False,
     verbose: bool = False):
     """CLI Tool to help you migrate your targets from the GitHub or GitHub Enterprise integration to the new GitHub App Integration
     """
@@ -77,186 +248,725 @@ def main(
         print("Must me either 'eu' or 'au'")
         return
 
-    if verify_org_integrations(snyk_token, org_id, github_server_app=github_server_app, tenant=tenant):
-        targets = get_all_targets(snyk_token, org_id, tenant=tenant)
+    if resume and not journal:
+        print("--resume needs the --journal of the run to resume")
+        return
+
+    shard_spec = parse_shard(shard)
+
+    if shard and not shard_spec:
+        print(f"Invalid shard: {shard}")
+        print("Must be INDEX/COUNT, with INDEX from 0 to COUNT - 1")
+        return
+
+    output_format, results = result_output
+
+    if output_format not in ('', 'jsonl'):
+        print(f"Invalid output format: {output_format}")
+        print("Must be 'jsonl'")
+        return
+
+    if console_output not in ('rich', 'buffered', 'summary'):
+        print(f"Invalid console-output: {console_output}")
+        print("Must be either 'rich', 'buffered' or 'summary'")
+        return
+
+    if shard_by not in ('target', 'org'):
+        print(f"Invalid shard-by: {shard_by}")
+        print("Must be either 'target' or 'org'")
+        return
+
+    if shard_by == 'org' and not group:
+        print("--shard-by org needs --group, a single org can only be sharded by target")
+        return
+
+    if apply and (plan_out or dry_run or count_only):
+        print("--apply migrates the targets of a plan, it cannot be used with --plan-out, --dry-run or --count-only")
+        return
+
+    if pipeline and use_asyncio:
+        print("--asyncio lists every origin concurrently before migrating, it cannot be used with --pipeline")
+        return
+
+    # every argument is validated by now, nothing below may be set up for a rejected invocation
+
+    if profile or profile_memory:
+        state["profiler"] = Profiler(profile, memory=profile_memory)
+
+    config = {
+        'verbose': verbose,
+        'rate_limit': rate_limit,
+        'max_attempts': max_attempts,
+        'concurrency': concurrency if adaptive_concurrency else 0,
+        'journal': journal,
+        'resume': resume,
+        'shard': shard_spec + (shard_by,) if shard_spec else None,
+        'console_output': console_output,
+        'results': results,
+        'destination': 'github-server-app' if github_server_app else 'github-cloud-app',
+        'trace_output': trace_output
+    }
+
+    setup_state(**config)
+
+    if state["tracer"]:
+        state["tracer"].root['attributes'].update({
+            'snyk.group_id' if group else 'snyk.org_id': org_id,
+            'snyk.dry_run': dry_run or bool(plan_out) or count_only,
+            'snyk.concurrency': concurrency,
+            'snyk.processes': processes
+        })
+
+    if resume:
+        print(f"Resuming from {journal}, skipping {len(state['journal'].completed)} completed targets")
 
-        if include_github_targets:
-            targets.extend(get_all_targets(snyk_token, org_id, origin='github', tenant=tenant))
+    origins = ['github-enterprise']
 
-        if (dry_run):
-            dry_run_targets(targets)
+    if include_github_targets:
+        origins.append('github')
+
+    if plan_out:
+        state["plan"] = MigrationPlan(plan_out, org_id, tenant, 'github-server-app' if github_server_app else 'github-cloud-app')
+        dry_run = True
+
+    workers = queue_workers if queue_path else processes
+
+    # workers share the run's rate limit and concurrency bound
+    worker_state = dict(
+        config,
+        rate_limit=rate_limit / workers,
+        concurrency=max(1, concurrency // workers) if adaptive_concurrency else 0,
+        trace_parent=(state["tracer"].trace_id, state["tracer"].parent_id) if state["tracer"] else None)
+
+    if show_progress and not dry_run and not count_only:
+        state["progress"] = MigrationProgress()
+        live = Live(get_renderable=state["progress"].__rich__, refresh_per_second=SNYK_PROGRESS_REFRESH, redirect_stdout=True, redirect_stderr=True)
+        live.start()
+
+    if metrics_textfile:
+        state["metrics_textfile"] = MetricsTextfile(metrics_textfile)
+
+    try:
+        if count_only:
+            count_targets(
+                snyk_token,
+                org_id,
+                origins,
+                group=group,
+                tenant=tenant,
+                org_concurrency=org_concurrency)
+        elif apply:
+            apply_plan(
+                snyk_token,
+                org_id,
+                apply,
+                concurrency=concurrency,
+                pool_size=pool_size,
+                use_asyncio=use_asyncio)
+        elif queue_path and not dry_run:
+            run_work_queue(
+                snyk_token,
+                org_id,
+                origins,
+                queue_path,
+                queue_workers,
+                group=group,
+                enqueue=enqueue,
+                retry_failed=retry_failed,
+                tenant=tenant,
+                github_server_app=github_server_app,
+                concurrency=concurrency,
+                skip_migrated=skip_migrated,
+                worker_state=worker_state)
+        elif group and processes > 1 and not plan_out:
+            migrate_group_in_processes(
+                snyk_token,
+                org_id,
+                origins,
+                processes,
+                tenant=tenant,
+                dry_run=dry_run,
+                github_server_app=github_server_app,
+                concurrency=concurrency,
+                skip_migrated=skip_migrated,
+                use_asyncio=use_asyncio,
+                worker_state=worker_state)
+        elif group:
+            migrate_group(
+                snyk_token,
+                org_id,
+                origins,
+                tenant=tenant,
+                dry_run=dry_run,
+                github_server_app=github_server_app,
+                concurrency=concurrency,
+                org_concurrency=org_concurrency,
+                pool_size=pool_size,
+                skip_migrated=skip_migrated,
+                use_asyncio=use_asyncio)
         else:
-            migrate_targets(snyk_token, org_id, targets, github_server_app=github_server_app, tenant=tenant)
+            try:
+                listed = migrate_org(
+                    snyk_token,
+                    org_id,
+                    origins,
+                    tenant=tenant,
+                    dry_run=dry_run,
+                    github_server_app=github_server_app,
+                    concurrency=concurrency,
+                    pool_size=pool_size,
+                    pipeline=pipeline,
+                    skip_migrated=skip_migrated,
+                    use_asyncio=use_asyncio)
+            except TargetListingError as exc:
+                print(f"Unable to list targets for Snyk org: {org_id}, reason: {exc}")
+                listed = False
+
+            # an org that failed verification or listing cannot be migrated, a plan for it would be misleading
+            if not listed and state["plan"]:
+                state["plan"].discard()
+                state["plan"] = None
+                print(f"No migration plan written to {plan_out}")
+    finally:
+        if state["metrics_textfile"]:
+            state["metrics_textfile"].close()
+
+        if state["progress"]:
+            live.stop()
+
+        if state["console"]:
+            state["console"].close()
+            # anything printed from here on is no longer per-target output
+            state["console"] = None
+
+        if state["results"]:
+            state["results"].close()
+
+        if state["journal"]:
+            state["journal"].close()
+
+        if state["plan"]:
+            state["plan"].close()
+            print(f"Wrote migration plan to {plan_out}")
+
+        if state["tracer"]:
+            state["tracer"].close()
+
+        if state["profiler"]:
+            state["profiler"].close()
+
+    if state["metrics"].endpoints:
+        print()
+        state["metrics"].print()
+
+    if metrics_json:
+        with open(metrics_json, 'w', encoding='utf-8') as file:
+            json.dump(state["metrics"].report(), file, indent=2)
+
+def setup_state(verbose=False, rate_limit=SNYK_RATE_LIMIT_DEFAULT, max_attempts=SNYK_RETRY_ATTEMPTS, concurrency=0, journal='', resume=False, shard=None, console_output='rich', results='', destination='github-cloud-app', trace_output='', trace_parent=None):
+    """Create the rate limiter, retry policy, concurrency controller and journal shared by every API call
+
+    Args:
+        verbose (bool, optional): Print retries and throttling
+        rate_limit (float, optional): Maximum requests per second, 0 only slows down once throttled
+        max_attempts (int, optional): Number of times a request is sent before giving up
+        concurrency (int, optional): Upper bound for adaptive concurrency, 0 keeps concurrency fixed
+        journal (str, optional): Checkpoint journal the outcome of every target is appended to
+        resume (bool, optional): Skip the targets the journal records as completed
+        shard (tuple, optional): Index, count and 'target' or 'org', the slice of the migration this run owns
+        console_output (str, optional): 'rich', 'buffered' or 'summary'
+        results (str, optional): JSON Lines file receiving one record per target
+        destination (str, optional): Integration the targets are migrated to
+        trace_output (str, optional): File receiving the spans of the run as OTLP JSON
+        trace_parent (tuple, optional): Trace ID and span ID a worker process adds its spans to
+    """
+    if verbose:
+        state["verbose"] = True
+
+    state["rate_limiter"] = RateLimiter(rate_limit)
+    state["retry_policy"] = RetryPolicy(max_attempts=max_attempts)
+
+    if concurrency:
+        state["concurrency_controller"] = ConcurrencyController(concurrency)
+
+    if journal:
+        state["journal"] = Journal(journal, resume=resume)
 
-def verify_org_integrations(snyk_token, org_id, github_server_app=False, tenant=''):
-    """Helper function to make sure the Snyk Organization has the relevant github integrations set up
+    state["shard"] = shard
+    state["metrics"] = RequestMetrics()
+
+    if console_output != 'rich':
+        state["console"] = ConsoleWriter(summary_only=console_output == 'summary')
+
+    if results:
+        state["results"] = ResultStream(results, destination)
+
+    if trace_output:
+        state["tracer"] = Tracer(trace_output, *(trace_parent or ()))
+
+def setup_worker_state(**config):
+    """Initializer of worker processes, replacing the state inherited from the parent process with the worker's own
+
+    Args:
+        **config: Keyword arguments for setup_state
+    """
+    # profiling hooks survive the fork, but nothing would ever collect a worker's profile
+    if state["profiler"]:
+        state["profiler"].detach()
+
+    for key in state:
+        state[key] = None
+
+    state["verbose"] = False
+
+    # a forked worker inherits the output redirected to the parent's progress display
+    sys.stdout = sys.__stdout__
+    sys.stderr = sys.__stderr__
+    rich.reconfigure()
+
+    setup_state(**config)
+
+def migrate_group_in_processes(snyk_token, group_id, origins, processes, tenant='', dry_run=False, github_server_app=False, concurrency=SNYK_CONCURRENCY_DEFAULT, skip_migrated=False, use_asyncio=False, worker_state=None):
+    """Share the orgs of a group between worker processes, each running migrate_org for one org at a time
+
+    Every process decodes its own API responses and renders its own output, so JSON handling
+    no longer competes for a single GIL. Per-org results are sent back to this process as each
+    org finishes. The concurrency and rate limit budgets are split evenly between the processes.
 
     Args:
         snyk_token (str): Snyk API token
-        org_id (str): Snyk Organization ID
-        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        group_id (str): Snyk Group ID
+        origins (list): Origins of the targets to migrate
+        processes (int): Number of worker processes
         tenant (str, optional): Snyk tenant
-
-    Returns:
-        bool: _description_
+        dry_run (bool, optional): Only print the targets that would be migrated
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        concurrency (int, optional): Number of targets to migrate in parallel across all processes. Defaults to 1.
+        skip_migrated (bool, optional): Leave out targets whose repository already has a GitHub App target
+        use_asyncio (bool, optional): Run every org from an asyncio event loop in its worker process
+        worker_state (dict, optional): Keyword arguments for setup_state in every worker process
     """
-    headers = {
-        'Authorization': f'token {snyk_token}'
+    summary = MigrationSummary()
+
+    with create_session(SNYK_POOL_HOSTS) as session:
+        orgs = shard_orgs(get_group_orgs(snyk_token, group_id, tenant=tenant, session=session), state["shard"])
+
+    if not orgs:
+        return
+
+    for org_id, name in orgs:
+        summary.add_org(org_id, name)
+
+    options = {
+        'tenant': tenant,
+        'dry_run': dry_run,
+        'github_server_app': github_server_app,
+        'concurrency': max(1, concurrency // processes),
+        'skip_migrated': skip_migrated,
+        'use_asyncio': use_asyncio
     }
 
-    base_url = SNYK_V1_API_BASE_URL
+    with ProcessPoolExecutor(max_workers=processes, initializer=partial(setup_worker_state, **(worker_state or {}))) as executor:
+        futures = [executor.submit(migrate_org_worker, snyk_token, org_id, origins, options) for org_id, _ in orgs]
 
-    if tenant == 'au':
-        base_url = SNYK_V1_API_BASE_URL_AU
-    if tenant == 'eu':
-        base_url = SNYK_V1_API_BASE_URL_EU
+        for future in as_completed(futures):
+            org_id, status, counts, metrics = future.result()
+            state["metrics"].merge(metrics)
 
-    url = f"{base_url}/org/{org_id}/integrations"
+            if state["progress"]:
+                state["progress"].merge(counts)
 
-    try:
-        response = requests.request(
-            'GET',
-            url,
-            headers=headers,
-            timeout=SNYK_API_TIMEOUT_DEFAULT
-        )
-    except requests.ConnectionError:
-        print(f"Unable to connect to {base_url}")
-        return False
-    else:
-        if response.status_code != 200:
-            print(f"Unable to retrieve integrations for Snyk org: {org_id}, reason: {response.status_code}")
-            return False
+            name = summary.orgs[org_id][0]
+            summary.add_org(org_id, name, status=status)
+            summary.merge(org_id, counts)
+            output(f"Finished org: {org_id} {name}, migrated: {counts.get('migrated', 0)}, already migrated: {counts.get('already_migrated', 0)}, failed: {counts.get('failed', 0)}")
 
-        integrations = json.loads(response.content)
+    if state["console"]:
+        state["console"].flush()
 
-        if ('github-enterprise' not in integrations and
-            'github' not in integrations):
+    print()
+    summary.print()
 
-            print(f"No GitHub or GitHub Enterprise integration detected for Snyk Org: {org_id}")
-            return False
+def migrate_org_worker(snyk_token, org_id, origins, options):
+    """Run migrate_org in a worker process and collect the outcome counts of the org
 
-        if (github_server_app):
-            if ('github-server-app' not in integrations):
-                print(f"No GitHub Server App integration detected for Snyk Org: {org_id}, please set up before migrating GitHub or GitHub Enterprise targets")
-        else:
-            if ('github-cloud-app' not in integrations):
-                print(f"No GitHub Cloud App integration detected for Snyk Org: {org_id}, please set up before migrating GitHub or GitHub Enterprise targets")
-                return False
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origins (list): Origins of the targets to migrate
+        options (dict): Keyword arguments for migrate_org
+
+    Returns:
+        tuple: org ID, its status for the summary, its outcome counts and the request metrics of the org
+    """
+    state["summary"] = MigrationSummary()
+
+    try:
+        status = '' if migrate_org(snyk_token, org_id, origins, **options) else 'not verified'
+    except (requests.RequestException, httpx.HTTPError, ValueError) as exc:
+        output(f"Unable to migrate Snyk org: {org_id}, reason: {exc}")
+        status = f'error: {exc}'
+
+    if state["console"]:
+        state["console"].flush()
 
-        return True
+    if state["tracer"]:
+        state["tracer"].flush()
 
-def get_all_targets(snyk_token, org_id, origin='github-enterprise', tenant=''):
-    """Helper function to retrieve targets in an org
+    return org_id, status, dict(state["summary"].counts.get(org_id, {})), state["metrics"].drain()
+
+def migrate_org(snyk_token, org_id, origins, tenant='', dry_run=False, github_server_app=False, concurrency=SNYK_CONCURRENCY_DEFAULT, pool_size=0, pipeline=False, skip_migrated=False, use_asyncio=False):
+    """Verify, list and migrate (or dry run) the targets of a single org
 
     Args:
         snyk_token (str): Snyk API token
         org_id (str): Snyk Organization ID
-        origin (str, optional): Filter to retrieve targets of a certain origin. Defaults to 'github-enterprise'.
+        origins (list): Origins of the targets to migrate
         tenant (str, optional): Snyk tenant
+        dry_run (bool, optional): Only print the targets that would be migrated
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        concurrency (int, optional): Number of targets to migrate in parallel. Defaults to 1.
+        pool_size (int, optional): Connections kept alive per host, defaults to concurrency + 1
+        pipeline (bool, optional): Migrate each page of targets as soon as it is listed
+        skip_migrated (bool, optional): Leave out targets whose repository already has a GitHub App target
+        use_asyncio (bool, optional): Verify, list and migrate from an asyncio event loop, see migrate_org_async
 
     Returns:
-        list: github targets in a snyk org
+        bool: False when the org does not have the required integrations
+
+    Raises:
+        TargetListingError: when the targets of the org cannot all be listed
     """
+    if use_asyncio:
+        return asyncio.run(migrate_org_async(snyk_token, org_id, origins, tenant=tenant, dry_run=dry_run, github_server_app=github_server_app, concurrency=concurrency, pool_size=pool_size, skip_migrated=skip_migrated))
 
-    targets = []
+    with create_session(pool_size or concurrency + 1) as session, trace('org', **{'snyk.org_id': org_id}):
+        with trace('verify'):
+            verified = verify_org_integrations(snyk_token, org_id, github_server_app=github_server_app, tenant=tenant, session=session)
 
-    headers = {
-        'Authorization': f'token {snyk_token}'
-    }
+        if state["profiler"]:
+            state["profiler"].phase(f"verifying {org_id}")
+
+        if not verified:
+            return False
+
+        # pipelined targets are listed while they are migrated, their requests belong to the migrate span
+        with trace('list'):
+            if pipeline and not dry_run:
+                targets = iter_pipelined_targets(snyk_token, org_id, origins, tenant=tenant, session=session)
+            else:
+                targets = get_targets_for_origins(snyk_token, org_id, origins, tenant=tenant, session=session)
 
-    base_url = SNYK_REST_API_BASE_URL
+            targets = filter_targets(targets)
 
-    if tenant == 'au':
-        base_url = SNYK_REST_API_BASE_URL_AU
-    if tenant == 'eu':
-        base_url = SNYK_REST_API_BASE_URL_EU
+            if skip_migrated:
+                targets = exclude_migrated(targets, get_migrated_index(snyk_token, org_id, github_server_app=github_server_app, tenant=tenant, session=session))
 
-    url = f'{base_url}/rest/orgs/{org_id}/targets?version={SNYK_REST_API_VERSION}&limit=100&source_types={origin}&exclude_empty=false'
+        if state["profiler"]:
+            state["profiler"].phase(f"listing {org_id}")
 
-    while True:
-        response = requests.request(
-            'GET',
-            url,
-            headers=headers,
-            timeout=SNYK_API_TIMEOUT_DEFAULT)
+        if state["summary"]:
+            targets = state["summary"].count_listed(org_id, targets)
 
-        response_json = json.loads(response.content)
+        with trace('dry run' if dry_run else 'migrate'):
+            if (dry_run):
+                dry_run_targets(targets)
+            else:
+                migrate_targets(snyk_token, org_id, targets, github_server_app=github_server_app, tenant=tenant, concurrency=concurrency, session=session)
 
-        if 'data' in response_json:
-            targets = targets + response_json['data']
+        if state["profiler"]:
+            state["profiler"].phase(f"migrating {org_id}")
 
-        if 'next' not in response_json['links'] or response_json['links']['next'] == '':
-            break
-        url = f"{base_url}/{response_json['links']['next']}"
+    return True
 
-    return targets
+def migrate_group(snyk_token, group_id, origins, tenant='', dry_run=False, github_server_app=False, concurrency=SNYK_CONCURRENCY_DEFAULT, org_concurrency=SNYK_ORG_CONCURRENCY_DEFAULT, pool_size=0, skip_migrated=False, use_asyncio=False):
+    """Verify, list and migrate (or dry run) the targets of every org in a group
 
-def dry_run_targets(targets):
-    """Print targets that would get migrated to GitHub App integration without migrating them
+    Orgs are verified and listed in parallel. Every org's targets join a single round-robin
+    stream as soon as its listing completes, and that stream is migrated by one worker pool,
+    so `concurrency` caps the PATCH requests of the whole group while every org gets its turn.
 
     Args:
-        targets: List of targets to be logged
+        snyk_token (str): Snyk API token
+        group_id (str): Snyk Group ID
+        origins (list): Origins of the targets to migrate
+        tenant (str, optional): Snyk tenant
+        dry_run (bool, optional): Only print the targets that would be migrated
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        concurrency (int, optional): Number of targets to migrate in parallel across the group. Defaults to 1.
+        org_concurrency (int, optional): Number of orgs verified and listed in parallel
+        pool_size (int, optional): Connections kept alive per host, defaults to concurrency + org_concurrency
+        skip_migrated (bool, optional): Leave out targets whose repository already has a GitHub App target
+        use_asyncio (bool, optional): Verify, list and migrate from an asyncio event loop, see migrate_group_async
     """
-    for target in targets:
-        print(f"Target: {target['id']}, Name: {target['attributes']['display_name']}")
+    if use_asyncio:
+        asyncio.run(migrate_group_async(snyk_token, group_id, origins, tenant=tenant, dry_run=dry_run, github_server_app=github_server_app, concurrency=concurrency, org_concurrency=org_concurrency, pool_size=pool_size, skip_migrated=skip_migrated))
+        return
+
+    summary = MigrationSummary()
+    state["summary"] = summary
+
+    with create_session(pool_size or concurrency + org_concurrency) as session:
+        orgs = shard_orgs(get_group_orgs(snyk_token, group_id, tenant=tenant, session=session), state["shard"])
+
+        if state["profiler"]:
+            state["profiler"].phase(f"listing the orgs of {group_id}")
+
+        if not orgs:
+            return
+
+        for org_id, name in orgs:
+            summary.add_org(org_id, name)
+
+        def list_org(org_id, name):
+            # a failing org must not take the listing future, and with it the whole group, down
+            try:
+                with trace('org', **{'snyk.org_id': org_id, 'snyk.org_name': name}):
+                    targets = list_org_targets(snyk_token, org_id, origins, tenant=tenant, github_server_app=github_server_app, skip_migrated=skip_migrated, session=session)
+            except (requests.RequestException, ValueError) as exc:
+                output(f"Unable to list targets for Snyk org: {org_id}, reason: {exc}")
+                summary.add_org(org_id, name, status=f'error: {exc}')
+                return []
+
+            if targets is None:
+                summary.add_org(org_id, name, status='not verified')
+                return []
+
+            summary.add_org(org_id, name, listed=len(targets))
+            return targets
+
+        with ThreadPoolExecutor(max_workers=org_concurrency) as executor, trace('dry run' if dry_run else 'migrate'):
+            targets = round_robin([executor.submit(in_context(list_org), org_id, name) for org_id, name in orgs])
+
+            if (dry_run):
+                dry_run_targets(targets)
+            else:
+                migrate_targets(snyk_token, None, targets, github_server_app=github_server_app, tenant=tenant, concurrency=concurrency, session=session)
+
+        if state["profiler"]:
+            state["profiler"].phase(f"migrating the orgs of {group_id}")
+
+    if state["console"]:
+        state["console"].flush()
 
     print()
-    print(f"Total Targets: {len(targets)}")
+    summary.print()
 
-def migrate_targets(snyk_token, org_id, targets, github_server_app=False, tenant=''):
-    """Helper function to migrate list of github and github-enterprise targets to github-cloud-app
+def count_targets(snyk_token, org_id, origins, group=False, tenant='', org_concurrency=SNYK_ORG_CONCURRENCY_DEFAULT):
+    """Print the number of targets of every origin in an org, or in every org of a group
 
     Args:
         snyk_token (str): Snyk API token
-        org_id (str): Snyk Organization ID
-        targets (list): List of targets to be migrated
-        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        org_id (str): Snyk Organization ID, or Snyk Group ID with group
+        origins (list): Origins to count targets for
+        group (bool, optional): Count the targets of every org in the group
         tenant (str, optional): Snyk tenant
+        org_concurrency (int, optional): Number of orgs counted in parallel
+    """
+    with create_session(org_concurrency * len(origins)) as session:
+        orgs = shard_orgs(get_group_orgs(snyk_token, org_id, tenant=tenant, session=session), state["shard"]) if group else [(org_id, '')]
+
+        with ThreadPoolExecutor(max_workers=org_concurrency * len(origins)) as executor:
+            counts = {
+                org: [executor.submit(get_target_count, snyk_token, org[0], origin=origin, tenant=tenant, session=session) for origin in origins]
+                for org in orgs
+            }
+
+            table = Table(title='Target Counts')
+
+            for column in ('Org ID', 'Name', *origins, 'Total', 'Status'):
+                table.add_column(column)
+
+            totals = [0] * len(origins)
+            failed = 0
+
+            for (counted_org_id, name), futures in counts.items():
+                # an org that cannot be counted must not take the counts of the other orgs down
+                try:
+                    org_counts = [future.result() for future in futures]
+                except (requests.RequestException, ValueError) as exc:
+                    failed += 1
+                    table.add_row(counted_org_id, name, *['-'] * len(origins), '-', f'error: {exc}')
+                    continue
+
+                totals = [total + count for total, count in zip(totals, org_counts)]
+                table.add_row(counted_org_id, name, *map(str, org_counts), str(sum(org_counts)), '')
+
+    if group:
+        table.add_section()
+        table.add_row('Total', f"{len(orgs)} orgs", *map(str, totals), str(sum(totals)), f"{failed} not counted" if failed else '')
+
+    print(table)
+
+def apply_plan(snyk_token, org_id, path, concurrency=SNYK_CONCURRENCY_DEFAULT, pool_size=0, use_asyncio=False):
+    """Migrate the targets of a plan written by --plan-out
+
+    The plan already holds the verified and listed targets, with their tenant and destination,
+    so the only API calls are the migrations themselves.
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization (or Group) ID the plan was written for
+        path (str): Plan file
+        concurrency (int, optional): Number of targets to migrate in parallel. Defaults to 1.
+        pool_size (int, optional): Connections kept alive per host, defaults to concurrency + 1
+        use_asyncio (bool, optional): Migrate the targets from an asyncio event loop
     """
+    try:
+        header, targets = MigrationPlan.read(path)
+    except (OSError, ValueError) as exc:
+        print(f"Unable to read migration plan: {path}, reason: {exc}")
+        return
+
+    if header['org_id'] != org_id:
+        print(f"Migration plan {path} was written for {header['org_id']}, not {org_id}")
+        return
 
-    base_url = SNYK_HIDDEN_API_BASE_URL
+    github_server_app = header['source_type'] == 'github-server-app'
+    targets = filter_targets(targets)
 
-    if tenant == 'au':
-        base_url = SNYK_HIDDEN_API_BASE_URL_AU
-    if tenant == 'eu':
-        base_url = SNYK_HIDDEN_API_BASE_URL_EU
+    if use_asyncio:
+        async def migrate():
+            async with create_async_client(pool_size or concurrency + 1) as client:
+                with trace('migrate', **{'snyk.plan': path}):
+                    await migrate_targets_async(client, snyk_token, org_id, targets, github_server_app=github_server_app, tenant=header['tenant'], concurrency=concurrency)
 
-    source_type = 'github-cloud-app'
+        asyncio.run(migrate())
+        return
 
-    if github_server_app:
-        source_type = 'github-server-app'
+    with create_session(pool_size or concurrency + 1) as session, trace('migrate', **{'snyk.plan': path}):
+        migrate_targets(snyk_token, org_id, targets, github_server_app=github_server_app, tenant=header['tenant'], concurrency=concurrency, session=session)
 
-    headers = {
-        'Content-Type': 'application/vnd.api+json',
-        'Authorization': f'token {snyk_token}'
+def run_work_queue(snyk_token, org_id, origins, path, workers, group=False, enqueue=True, retry_failed=False, tenant='', github_server_app=False, concurrency=SNYK_CONCURRENCY_DEFAULT, skip_migrated=False, worker_state=None):
+    """Fill a work queue with the targets of an org (or group) and migrate them from worker processes
+
+    Workers lease small batches of targets, so fast workers simply come back for more. Other
+    invocations on the same machine can join with enqueue disabled and the same queue file.
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID, or Snyk Group ID with group
+        origins (list): Origins of the targets to migrate
+        path (str): SQLite file holding the queue
+        workers (int): Number of worker processes
+        group (bool, optional): Enqueue the targets of every org in the group
+        enqueue (bool, optional): List and enqueue targets before working the queue
+        retry_failed (bool, optional): Queue the targets that failed in an earlier run again
+        tenant (str, optional): Snyk tenant
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        concurrency (int, optional): Number of targets each worker migrates in parallel. Defaults to 1.
+        skip_migrated (bool, optional): Leave out targets whose repository already has a GitHub App target
+        worker_state (dict, optional): Keyword arguments for setup_state in every worker process
+    """
+    work_queue = WorkQueue(path)
+
+    if enqueue:
+        with create_session(SNYK_POOL_HOSTS) as session:
+            orgs = shard_orgs(get_group_orgs(snyk_token, org_id, tenant=tenant, session=session), state["shard"]) if group else [(org_id, '')]
+
+            for queued_org_id, _ in orgs:
+                try:
+                    targets = list_org_targets(snyk_token, queued_org_id, origins, tenant=tenant, github_server_app=github_server_app, skip_migrated=skip_migrated, session=session)
+                except TargetListingError as exc:
+                    # a partial listing is not queued, a later run with --enqueue can queue the org
+                    print(f"Unable to list targets for Snyk org: {queued_org_id}, reason: {exc}")
+                    continue
+
+                if targets is not None:
+                    print(f"Queued {work_queue.put(targets)} new targets of Snyk org: {queued_org_id}")
+
+    if retry_failed:
+        print(f"Queued {work_queue.retry_failed()} failed targets again")
+
+    options = {
+        'tenant': tenant,
+        'github_server_app': github_server_app,
+        'concurrency': concurrency
     }
 
-    for target in targets:
-        url = f"{base_url}/orgs/{org_id}/targets/{target['id']}?version={SNYK_HIDDEN_API_VERSION}"
+    progress = state["progress"]
 
-        body = json.dumps({
-            "data": {
-                "id": f"{target['id']}",
-                "attributes": {
-                    "source_type": f"{source_type}"
-                }
-            }
-        })
+    if progress:
+        counts = work_queue.counts()
+        progress.fix_total(counts.get('pending', 0) + counts.get('leased', 0))
 
-        response = requests.request(
-            "PATCH",
-            url,
-            headers=headers,
-            data=body,
-            timeout=SNYK_API_TIMEOUT_DEFAULT)
-
-        if response.status_code == 200:
-            print(f"Migrated target: {target['id']} {target['attributes']['display_name']} to {source_type}")
-        elif response.status_code == 409:
-            print(f"Unable to migrate target: {target['id']} {target['attributes']['display_name']} to {source_type} because it has already been migrated")
-        else:
-            print(f"Unable to migrate target: {target['id']} {target['attributes']['display_name']} to {source_type}, reason: {response.status_code}, request ID: {response.headers['snyk-request-id']}")
+    if workers == 1:
+        work_queue_worker(snyk_token, path, options)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=partial(setup_worker_state, **(worker_state or {}))) as executor:
+            pending = {executor.submit(work_queue_process, snyk_token, path, options) for _ in range(workers)}
+            reported = work_queue.outcomes()
+
+            while pending:
+                done, pending = wait(pending, timeout=1 / SNYK_PROGRESS_REFRESH)
+
+                for future in done:
+                    state["metrics"].merge(future.result())
+
+                # worker processes record outcomes in the queue, not in this process' progress display
+                if progress:
+                    outcomes = work_queue.outcomes()
+                    progress.merge(outcomes - reported)
+                    reported = outcomes
+
+    counts = work_queue.counts()
+    work_queue.close()
+
+    print()
+    print(f"Queue: {counts.get('done', 0)} done, {counts.get('failed', 0)} failed, {counts.get('pending', 0) + counts.get('leased', 0)} remaining")
+
+def work_queue_process(snyk_token, path, options):
+    """Run work_queue_worker in a worker process and collect its request metrics
+
+    Args:
+        snyk_token (str): Snyk API token
+        path (str): SQLite file holding the queue
+        options (dict): tenant, github_server_app and concurrency for migrate_targets
+
+    Returns:
+        dict: request metrics of this task
+    """
+    work_queue_worker(snyk_token, path, options)
+
+    return state["metrics"].drain()
+
+def work_queue_worker(snyk_token, path, options):
+    """Lease batches of targets from the work queue and migrate them until the queue is drained
+
+    Args:
+        snyk_token (str): Snyk API token
+        path (str): SQLite file holding the queue
+        options (dict): tenant, github_server_app and concurrency for migrate_targets
+    """
+    work_queue = WorkQueue(path)
+    state["work_queue"] = work_queue
+    concurrency = options['concurrency']
+    stopped = threading.Event()
+
+    def renew():
+        # a batch can take longer than the lease timeout when requests keep being retried
+        while not stopped.wait(work_queue.lease_timeout / 3):
+            work_queue.renew()
+
+    renewal = threading.Thread(target=renew, daemon=True)
+    renewal.start()
+
+    try:
+        with create_session(concurrency + 1) as session:
+            while batch := work_queue.lease(concurrency * 2):
+                migrate_targets(snyk_token, None, batch, session=session, **options)
+    finally:
+        stopped.set()
+        renewal.join()
+
+        if state["console"]:
+            state["console"].flush()
+
+        state["work_queue"] = None
+        work_queue.close()
+
+        if state["tracer"]:
+            state["tracer"].flush()
 
 def run():
     """Run the defined typer CLI app
@@ -0,0 +1,324 @@
+"""Request metrics of a run, reported as a table, JSON or a Prometheus textfile
+"""
+
+# ===== IMPORTS =====
+
+import os
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from rich import print
+from rich.table import Table
+
+from snyk_migrate_to_github_app.constants import SNYK_METRICS_TEXTFILE_INTERVAL, SNYK_LATENCY_BUCKETS
+from snyk_migrate_to_github_app.state import state, output
+
+# ===== CLASSES =====
+
+class RequestMetrics:
+    """Per-endpoint request counts, failures, bytes and latency histograms of a run
+
+    Latencies are counted into fixed buckets, so memory does not grow with the number of
+    requests and percentiles are reported as the upper bound of the bucket they fall in.
+    A request counts as failed when it raised, was throttled or hit a server error.
+    The number of targets listed and migrated is kept alongside, per outcome.
+    """
+
+    def __init__(self):
+        self.endpoints = {}
+        self.targets = Counter()
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def begin(self):
+        """Count a request as in flight until it is recorded
+        """
+        with self.lock:
+            self.in_flight += 1
+
+    def record(self, method, url, latency, status='error', size=0, retry=False, waited=0.0):
+        """Count a single request
+
+        Args:
+            method (str): HTTP method
+            url (str): Request URL, IDs in the path are folded into the endpoint name
+            latency (float): Seconds the request took
+            status (str, optional): Response status code, 'error' when the request raised
+            size (int, optional): Bytes in the response body
+            retry (bool, optional): Whether the request was a retry
+            waited (float, optional): Seconds the request waited for the rate limiter
+        """
+        endpoint = endpoint_name(method, url)
+        bucket = next((index for index, bound in enumerate(SNYK_LATENCY_BUCKETS) if latency <= bound), len(SNYK_LATENCY_BUCKETS))
+
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, {
+                'count': 0,
+                'failed': 0,
+                'bytes': 0,
+                'retries': 0,
+                'waited': 0.0,
+                'max': 0.0,
+                'sum': 0.0,
+                'statuses': {},
+                'buckets': [0] * (len(SNYK_LATENCY_BUCKETS) + 1)
+            })
+            stats['count'] += 1
+            stats['failed'] += status in ('error', '429') or status.startswith('5')
+            stats['bytes'] += size
+            stats['retries'] += retry
+            stats['waited'] += waited
+            stats['max'] = max(stats['max'], latency)
+            stats['sum'] += latency
+            stats['statuses'][status] = stats['statuses'].get(status, 0) + 1
+            stats['buckets'][bucket] += 1
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def count_targets(self, outcome, count=1):
+        """Count targets listed or migrated
+
+        Args:
+            outcome (str): 'listed', 'migrated', 'already_migrated' or 'failed'
+            count (int, optional): Number of targets
+        """
+        with self.lock:
+            self.targets[outcome] += count
+
+    def snapshot(self):
+        """Copy of the collected metrics, to be sent from a worker process
+
+        Returns:
+            dict: endpoint statistics and target counts
+        """
+        with self.lock:
+            return {
+                'endpoints': {
+                    endpoint: dict(stats, statuses=dict(stats['statuses']), buckets=list(stats['buckets']))
+                    for endpoint, stats in self.endpoints.items()
+                },
+                'targets': dict(self.targets)
+            }
+
+    def drain(self):
+        """Copy of the metrics collected since the previous drain, which are then cleared
+
+        A worker process reports its metrics after every task, draining keeps the parent
+        process from counting the requests of earlier tasks again.
+
+        Returns:
+            dict: endpoint statistics and target counts, as returned by snapshot()
+        """
+        with self.lock:
+            snapshot = {'endpoints': self.endpoints, 'targets': dict(self.targets)}
+            self.endpoints = {}
+            self.targets = Counter()
+
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add metrics collected elsewhere, for instance in a worker process
+
+        Args:
+            snapshot (dict): Result of snapshot()
+        """
+        with self.lock:
+            for endpoint, other in snapshot['endpoints'].items():
+                stats = self.endpoints.setdefault(endpoint, dict(other, count=0, failed=0, bytes=0, retries=0, waited=0.0, max=0.0, sum=0.0, statuses={}, buckets=[0] * len(other['buckets'])))
+
+                for key in ('count', 'failed', 'bytes', 'retries', 'waited', 'sum'):
+                    stats[key] += other[key]
+
+                for status, count in other['statuses'].items():
+                    stats['statuses'][status] = stats['statuses'].get(status, 0) + count
+
+                stats['max'] = max(stats['max'], other['max'])
+                stats['buckets'] = [mine + theirs for mine, theirs in zip(stats['buckets'], other['buckets'])]
+
+            self.targets.update(snapshot['targets'])
+
+    @staticmethod
+    def percentile(stats, fraction):
+        """Upper bound of the bucket holding the given fraction of the requests
+
+        Args:
+            stats (dict): Statistics of one endpoint
+            fraction (float): Percentile as a fraction, e.g. 0.99
+
+        Returns:
+            float: latency in seconds, capped at the slowest request seen
+        """
+        seen = 0
+
+        for bound, count in zip(SNYK_LATENCY_BUCKETS + (stats['max'],), stats['buckets']):
+            seen += count
+
+            if seen >= fraction * stats['count']:
+                return min(bound, stats['max'])
+
+        return stats['max']
+
+    def report(self):
+        """Summary of every endpoint, as saved to the metrics JSON file
+
+        Returns:
+            dict: endpoint name to count, percentiles, maximum, error rate, bytes, retries and status codes
+        """
+        return {
+            endpoint: {
+                'count': stats['count'],
+                'p50': self.percentile(stats, 0.5),
+                'p90': self.percentile(stats, 0.9),
+                'p99': self.percentile(stats, 0.99),
+                'max': stats['max'],
+                'mean': stats['sum'] / stats['count'],
+                'error_rate': stats['failed'] / stats['count'],
+                'bytes': stats['bytes'],
+                'retries': stats['retries'],
+                'rate_limit_wait': stats['waited'],
+                'statuses': stats['statuses'],
+                'buckets': dict(zip([str(bound) for bound in SNYK_LATENCY_BUCKETS] + ['+Inf'], stats['buckets']))
+            }
+            for endpoint, stats in self.snapshot()['endpoints'].items()
+        }
+
+    def print(self):
+        """Print one row per endpoint
+        """
+        table = Table(title='API Performance')
+        table.add_column('Endpoint', overflow='fold')
+
+        for column in ('Requests', 'p50', 'p90', 'p99', 'Max', 'Errors', 'Bytes'):
+            table.add_column(column)
+
+        for endpoint, stats in sorted(self.report().items()):
+            table.add_row(
+                endpoint,
+                str(stats['count']),
+                *(f"{stats[key] * 1000:.0f} ms" for key in ('p50', 'p90', 'p99', 'max')),
+                f"{stats['error_rate']:.1%}",
+                str(stats['bytes']))
+
+        print(table)
+
+class MetricsTextfile:
+    """Background thread periodically writing the run's metrics in the Prometheus text format
+
+    The file is meant for the node_exporter textfile collector. Every write goes to a
+    temporary file in the same directory which then replaces the previous one, so the
+    collector never reads a partially written file.
+    """
+
+    def __init__(self, path, interval=SNYK_METRICS_TEXTFILE_INTERVAL):
+        """
+        Args:
+            path (str): File to write, should end in .prom for the textfile collector
+            interval (float, optional): Seconds between two writes
+        """
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        """Stop the thread and write the final metrics
+        """
+        self.stopped.set()
+        self.thread.join()
+
+    def run(self):
+        """Write the metrics every interval, and once more when stopped
+        """
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+        self.write()
+
+    def write(self):
+        """Render the metrics and atomically replace the file
+        """
+        metrics = state["metrics"]
+        snapshot = metrics.snapshot()
+        lines = []
+
+        def family(name, kind, description, samples):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        def labels(**values):
+            escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for key, value in values.items())
+            return '{' + ','.join(escaped) + '}'
+
+        endpoints = sorted(snapshot['endpoints'].items())
+
+        family('snyk_migrate_requests_total', 'counter', 'Snyk API requests sent, including retries', [
+            f"snyk_migrate_requests_total{labels(endpoint=endpoint, status=status)} {count}"
+            for endpoint, stats in endpoints
+            for status, count in sorted(stats['statuses'].items())
+        ])
+        family('snyk_migrate_request_retries_total', 'counter', 'Snyk API requests that were retries', [
+            f"snyk_migrate_request_retries_total{labels(endpoint=endpoint)} {stats['retries']}"
+            for endpoint, stats in endpoints
+        ])
+        family('snyk_migrate_rate_limit_wait_seconds_total', 'counter', 'Time requests waited for the rate limiter', [
+            f"snyk_migrate_rate_limit_wait_seconds_total{labels(endpoint=endpoint)} {stats['waited']:.6f}"
+            for endpoint, stats in endpoints
+        ])
+
+        histogram = []
+
+        for endpoint, stats in endpoints:
+            cumulative = 0
+
+            for bound, count in zip(SNYK_LATENCY_BUCKETS, stats['buckets']):
+                cumulative += count
+                histogram.append(f"snyk_migrate_request_duration_seconds_bucket{labels(endpoint=endpoint, le=bound)} {cumulative}")
+
+            histogram.append(f"snyk_migrate_request_duration_seconds_bucket{labels(endpoint=endpoint, le='+Inf')} {stats['count']}")
+            histogram.append(f"snyk_migrate_request_duration_seconds_sum{labels(endpoint=endpoint)} {stats['sum']:.6f}")
+            histogram.append(f"snyk_migrate_request_duration_seconds_count{labels(endpoint=endpoint)} {stats['count']}")
+
+        family('snyk_migrate_request_duration_seconds', 'histogram', 'Snyk API request latency', histogram)
+        family('snyk_migrate_requests_in_flight', 'gauge', 'Snyk API requests currently being sent', [
+            f"snyk_migrate_requests_in_flight {metrics.in_flight}"
+        ])
+        family('snyk_migrate_targets_total', 'counter', 'Targets listed and migrated, per outcome', [
+            f"snyk_migrate_targets_total{labels(outcome=outcome)} {count}"
+            for outcome, count in sorted(snapshot['targets'].items())
+        ])
+        family('snyk_migrate_last_update_timestamp_seconds', 'gauge', 'Time this file was last written', [
+            f"snyk_migrate_last_update_timestamp_seconds {time.time():.3f}"
+        ])
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        temporary = os.path.join(directory, f".{os.path.basename(self.path)}.{os.getpid()}.tmp")
+
+        try:
+            with open(temporary, 'w', encoding='utf-8') as file:
+                file.write('\n'.join(lines) + '\n')
+            os.replace(temporary, self.path)
+        except OSError as exc:
+            output(f"Unable to write metrics to {self.path}, reason: {exc}")
+
+# ===== METHODS =====
+
+def endpoint_name(method, url):
+    """Name an API endpoint by its method and path, with the IDs in the path replaced by placeholders
+
+    Args:
+        method (str): HTTP method
+        url (str): Request URL
+
+    Returns:
+        str: endpoint name, e.g. 'PATCH /hidden/orgs/{org_id}/targets/{target_id}'
+    """
+    segments = urlsplit(url).path.strip('/').split('/')
+
+    for index in range(1, len(segments)):
+        if segments[index - 1] in ('org', 'orgs', 'groups', 'targets'):
+            segments[index] = '{' + segments[index - 1].rstrip('s') + '_id}'
+
+    return f"{method.upper()} /{'/'.join(segments)}"
@@ -0,0 +1,241 @@
+"""Listing, dry running and migrating the targets of an org
+"""
+
+# ===== IMPORTS =====
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from rich import print
+
+from snyk_migrate_to_github_app.constants import SNYK_CONCURRENCY_DEFAULT
+from snyk_migrate_to_github_app.state import state, output
+from snyk_migrate_to_github_app.tracing import trace, in_context
+from snyk_migrate_to_github_app.sharding import shard_targets
+from snyk_migrate_to_github_app.api import verify_org_integrations, get_targets_for_origins, get_migrated_index, exclude_migrated, migrate_target
+
+# ===== METHODS =====
+
+def list_org_targets(snyk_token, org_id, origins, tenant='', github_server_app=False, skip_migrated=False, session=requests):
+    """Verify an org and list the targets this run has to migrate in it
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        origins (list): Origins of the targets to migrate
+        tenant (str, optional): Snyk tenant
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        skip_migrated (bool, optional): Leave out targets whose repository already has a GitHub App target
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+
+    Returns:
+        list[Target]: targets to migrate, None when the org does not have the required integrations
+
+    Raises:
+        TargetListingError: when the targets of the org cannot all be listed
+    """
+    with trace('verify'):
+        verified = verify_org_integrations(snyk_token, org_id, github_server_app=github_server_app, tenant=tenant, session=session)
+
+    if not verified:
+        return None
+
+    with trace('list'):
+        targets = filter_targets(get_targets_for_origins(snyk_token, org_id, origins, tenant=tenant, session=session))
+
+        if skip_migrated:
+            targets = exclude_migrated(targets, get_migrated_index(snyk_token, org_id, github_server_app=github_server_app, tenant=tenant, session=session))
+
+        return list(targets)
+
+def round_robin(futures):
+    """Generator taking one target from each org in turn, orgs join once their listing future completes
+
+    Args:
+        futures (list): Futures resolving to the targets of one org each
+
+    Yields:
+        Target: targets of all orgs, interleaved
+    """
+    pending = set(futures)
+    active = deque()
+
+    while pending or active:
+        done = {future for future in pending if future.done()}
+
+        if not done and not active:
+            done = wait(pending, return_when=FIRST_COMPLETED).done
+
+        for future in done:
+            pending.discard(future)
+            active.append(iter(future.result()))
+
+        if not active:
+            continue
+
+        targets = active.popleft()
+        target = next(targets, None)
+
+        if target is not None:
+            yield target
+            active.append(targets)
+
+def dry_run_targets(targets):
+    """Print targets that would get migrated to GitHub App integration without migrating them
+
+    Args:
+        targets: Targets to be logged
+    """
+    total = 0
+
+    for target in targets:
+        output(f"Target: {target.id}, Name: {target.display_name}", 'listed')
+        total += 1
+
+        if state["plan"]:
+            state["plan"].add(target)
+
+        if state["results"]:
+            state["results"].write(target, 'listed')
+
+    if state["console"]:
+        state["console"].flush()
+
+    print()
+    print(f"Total Targets: {total}")
+
+def migrate_targets(snyk_token, org_id, targets, github_server_app=False, tenant='', concurrency=SNYK_CONCURRENCY_DEFAULT, session=requests):
+    """Helper function to migrate list of github and github-enterprise targets to github-cloud-app
+
+    Args:
+        snyk_token (str): Snyk API token
+        org_id (str): Snyk Organization ID
+        targets (iterable): Targets to be migrated, may be a generator
+        github_server_app (bool, optional): Flag to indicate migrating to GitHub Server App
+        tenant (str, optional): Snyk tenant
+        concurrency (int, optional): Number of targets to migrate in parallel. Defaults to 1.
+        session (requests.Session, optional): Session used to send requests. Defaults to the requests module.
+    """
+
+    source_type = 'github-cloud-app'
+
+    if github_server_app:
+        source_type = 'github-server-app'
+
+    def report(done):
+        for future in done:
+            target = futures.pop(future)
+
+            try:
+                response = future.result()
+            except requests.RequestException as exc:
+                report_migration_result(target, source_type, error=exc)
+            else:
+                report_migration_result(target, source_type, response)
+
+    futures = {}
+    progress = state["progress"]
+
+    if progress:
+        progress.expect(targets)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            # targets may be a lazily listed generator, only keep a couple of batches in flight
+            for target in targets:
+                futures[executor.submit(in_context(migrate_target), snyk_token, org_id, target, source_type, tenant=tenant, session=session)] = target
+
+                if progress:
+                    progress.submit()
+
+                if len(futures) >= concurrency * 2:
+                    report(wait(futures, return_when=FIRST_COMPLETED).done)
+        finally:
+            # when listing fails halfway, the targets already sent are still reported and journaled
+            while futures:
+                report(wait(futures, return_when=FIRST_COMPLETED).done)
+
+def report_migration_result(target, source_type, response=None, error=None):
+    """Print the outcome of a single target migration and record it in the journal
+
+    Args:
+        target (Target): Target that was migrated
+        source_type (str): Integration the target was migrated to
+        response (requests.Response, optional): response from the hidden API
+        error (Exception, optional): error raised when the request could not be sent
+    """
+    outcome = migration_outcome(response)
+
+    if outcome == 'migrated':
+        line = f"Migrated target: {target.id} {target.display_name} to {source_type}"
+    elif outcome == 'already_migrated':
+        line = f"Unable to migrate target: {target.id} {target.display_name} to {source_type} because it has already been migrated"
+    elif error is not None:
+        line = f"Unable to migrate target: {target.id} {target.display_name} to {source_type}, reason: {error}"
+    else:
+        line = f"Unable to migrate target: {target.id} {target.display_name} to {source_type}, reason: {response.status_code}, request ID: {response.headers.get('snyk-request-id')}"
+
+    output(line, outcome)
+
+    if state["journal"]:
+        state["journal"].record(target, outcome)
+
+    if state["summary"]:
+        state["summary"].record(target.org_id, outcome)
+
+    if state["work_queue"] and not state["work_queue"].complete(target, outcome):
+        output(f"Lease on target {target.id} was lost to another worker, its outcome is not recorded in the queue")
+
+    if state["results"]:
+        state["results"].write(target, outcome, response, error)
+
+    if state["metrics"]:
+        state["metrics"].count_targets(outcome)
+
+    if state["progress"]:
+        state["progress"].record(outcome, response.elapsed.total_seconds() if response is not None else None)
+
+def migration_outcome(response):
+    """Classify the response of a migration request
+
+    Args:
+        response (requests.Response): response from the hidden API, None when no response was received
+
+    Returns:
+        str: 'migrated', 'already_migrated' or 'failed'
+    """
+    if response is None:
+        return 'failed'
+    if response.status_code == 200:
+        return 'migrated'
+    if response.status_code == 409:
+        return 'already_migrated'
+    return 'failed'
+
+def filter_targets(targets):
+    """Leave out targets completed by an earlier run or owned by another shard
+
+    Args:
+        targets (iterable): Targets to be migrated
+
+    Returns:
+        iterable: targets this run still has to migrate
+    """
+    return skip_completed(shard_targets(targets, state["shard"]))
+
+def skip_completed(targets):
+    """Leave out targets the journal of an earlier run already completed
+
+    Args:
+        targets (iterable): Targets to be migrated
+
+    Returns:
+        iterable: targets still to be migrated
+    """
+    journal = state["journal"]
+
+    if not journal or not journal.completed:
+        return targets
+
+    return (target for target in targets if target.id not in journal.completed)
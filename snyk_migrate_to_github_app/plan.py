@@ -0,0 +1,86 @@
+"""Plan files written by --plan-out and executed by --apply
+"""
+
+# ===== IMPORTS =====
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from snyk_migrate_to_github_app.target import Target
+
+# ===== CLASSES =====
+
+class MigrationPlan:
+    """Plan file listing the targets a migration will move, written during a dry run
+
+    The first line holds the org (or group) ID, tenant and destination source type, every
+    following line one target, so plans of any size are written and read in a single pass.
+    """
+
+    def __init__(self, path, org_id, tenant, source_type):
+        """
+        Args:
+            path (str): Plan file, overwritten when it exists
+            org_id (str): Snyk Organization (or Group) ID the plan is written for
+            tenant (str): Snyk tenant
+            source_type (str): Integration the targets are migrated to
+        """
+        self.lock = threading.Lock()
+        self.file = open(path, 'w', encoding='utf-8') # pylint: disable=consider-using-with
+        self.file.write(json.dumps({
+            'org_id': org_id,
+            'tenant': tenant,
+            'source_type': source_type,
+            'created': datetime.now(timezone.utc).isoformat()
+        }) + '\n')
+
+    def add(self, target):
+        """Add a target to the plan
+
+        Args:
+            target (Target): Target to be migrated
+        """
+        line = json.dumps({
+            'id': target.id,
+            'name': target.display_name,
+            'org_id': target.org_id,
+            'origin': target.source_type
+        })
+
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def close(self):
+        """Close the plan file
+        """
+        with self.lock:
+            self.file.close()
+
+    def discard(self):
+        """Close and delete the plan file, when there is nothing to plan
+        """
+        self.close()
+        os.remove(self.file.name)
+
+    @staticmethod
+    def read(path):
+        """Read a plan file
+
+        Args:
+            path (str): Plan file
+
+        Returns:
+            tuple: the plan header, and a generator of the planned targets
+        """
+        file = open(path, encoding='utf-8') # pylint: disable=consider-using-with
+        header = json.loads(file.readline())
+
+        def targets():
+            with file:
+                for line in file:
+                    entry = json.loads(line)
+                    yield Target(entry['id'], entry['name'], entry['origin'], org_id=entry['org_id'])
+
+        return header, targets()
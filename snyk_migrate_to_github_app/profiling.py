@@ -0,0 +1,130 @@
+"""CPU and memory profiling of a run
+"""
+
+# ===== IMPORTS =====
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+
+from rich import print
+from rich.table import Table
+
+from snyk_migrate_to_github_app.constants import SNYK_PROFILE_TOP, SNYK_PROFILE_ALLOCATIONS
+from snyk_migrate_to_github_app.state import output
+
+# ===== CLASSES =====
+
+class Profiler:
+    """CPU profile of a whole run and memory snapshots at its phase boundaries
+
+    The CPU profile covers the main thread and every thread started while it runs, and is
+    saved as a pstats file. Memory snapshots compare the allocations still alive at each
+    phase boundary with the previous one, listing the source lines that grew the most.
+    """
+
+    def __init__(self, path='', memory=False):
+        """
+        Args:
+            path (str, optional): pstats file the CPU profile is saved to, no CPU profile when empty
+            memory (bool, optional): Trace memory allocations
+        """
+        self.path = path
+        self.profilers = []
+        self.phases = []
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+        if memory:
+            tracemalloc.start()
+
+        if path:
+            self.profiler = cProfile.Profile()
+
+            if sys.version_info < (3, 12):
+                # cProfile only follows the thread that enabled it before Python 3.12
+                threading.setprofile(self.profile_thread)
+
+            self.profiler.enable()
+
+    def profile_thread(self, *_):
+        """Profile hook installed in every new thread, replaces itself with a profiler for that thread
+        """
+        profiler = cProfile.Profile()
+
+        with self.lock:
+            self.profilers.append(profiler)
+
+        profiler.enable()
+
+    def phase(self, name):
+        """Take a memory snapshot at a phase boundary
+
+        Args:
+            name (str): Phase that just ended
+        """
+        if not tracemalloc.is_tracing():
+            return
+
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__)])
+        current, peak = tracemalloc.get_traced_memory()
+
+        with self.lock:
+            if self.snapshot:
+                statistics = [(stat.traceback[0], stat.size_diff) for stat in snapshot.compare_to(self.snapshot, 'lineno')]
+            else:
+                statistics = [(stat.traceback[0], stat.size) for stat in snapshot.statistics('lineno')]
+
+            self.snapshot = snapshot
+            self.phases.append((name, current, peak, statistics[:SNYK_PROFILE_ALLOCATIONS]))
+
+    def detach(self):
+        """Stop profiling without saving anything, in a forked worker process that inherited the profiler
+        """
+        if self.path:
+            self.profiler.disable()
+            threading.setprofile(None)
+
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def close(self):
+        """Save the CPU profile and print the slowest functions and the memory snapshots
+        """
+        if self.path:
+            self.profiler.disable()
+            threading.setprofile(None)
+
+            stats = pstats.Stats(self.profiler)
+
+            for profiler in self.profilers:
+                profiler.disable()
+                stats.add(profiler)
+
+            stats.dump_stats(self.path)
+            print()
+            output(f"Wrote CPU profile to {self.path}")
+            stats.sort_stats(pstats.SortKey.TIME).print_stats(SNYK_PROFILE_TOP)
+
+        if tracemalloc.is_tracing():
+            self.phase('end of run')
+            tracemalloc.stop()
+
+            table = Table(title='Memory')
+
+            for column in ('After', 'Traced', 'Peak', 'Largest growth since the previous snapshot'):
+                table.add_column(column)
+
+            for name, current, peak, statistics in self.phases:
+                table.add_row(
+                    name,
+                    f"{current / 2**20:.1f} MiB",
+                    f"{peak / 2**20:.1f} MiB",
+                    '\n'.join(f"{os.path.basename(frame.filename)}:{frame.lineno} {size / 2**10:+.0f} KiB" for frame, size in statistics))
+
+            print(table)
@@ -0,0 +1,373 @@
+"""Console output, progress display and result records of a run
+"""
+
+# ===== IMPORTS =====
+
+import json
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+
+from rich import print
+from rich.table import Table
+
+from snyk_migrate_to_github_app.constants import SNYK_CONSOLE_FLUSH_INTERVAL, SNYK_CONSOLE_SUMMARY_INTERVAL, SNYK_PROGRESS_WINDOW, SNYK_PROGRESS_LATENCIES
+from snyk_migrate_to_github_app.state import state
+
+# ===== CLASSES =====
+
+class MigrationSummary:
+    """Thread-safe tally of migration outcomes per org, printed as one table at the end of a run
+    """
+
+    def __init__(self):
+        self.orgs = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def add_org(self, org_id, name, status='', listed=0):
+        """Register an org, and the number of targets listed in it
+
+        Args:
+            org_id (str): Snyk Organization ID
+            name (str): Snyk Organization name
+            status (str, optional): Reason the org was not migrated
+            listed (int, optional): Number of targets listed for migration
+        """
+        with self.lock:
+            self.orgs[org_id] = (name, status)
+            self.counts.setdefault(org_id, Counter())['listed'] += listed
+
+    def count_listed(self, org_id, targets):
+        """Generator passing targets through while counting them as listed
+
+        Args:
+            org_id (str): Snyk Organization ID
+            targets (iterable): Targets listed for migration
+
+        Yields:
+            Target: the same targets
+        """
+        for target in targets:
+            with self.lock:
+                self.counts.setdefault(org_id, Counter())['listed'] += 1
+            yield target
+
+    def merge(self, org_id, counts):
+        """Add counts collected elsewhere, for instance in a worker process
+
+        Args:
+            org_id (str): Snyk Organization ID
+            counts (dict): Outcome counts of the org
+        """
+        with self.lock:
+            self.counts.setdefault(org_id, Counter()).update(counts)
+
+    def record(self, org_id, outcome):
+        """Count the outcome of a single target migration
+
+        Args:
+            org_id (str): Snyk Organization ID of the target
+            outcome (str): 'migrated', 'already_migrated' or 'failed'
+        """
+        with self.lock:
+            self.counts.setdefault(org_id, Counter())[outcome] += 1
+
+    def print(self):
+        """Print one row per org and a total row
+        """
+        table = Table(title='Migration Summary')
+
+        for column in ('Org ID', 'Name', 'Targets', 'Migrated', 'Already Migrated', 'Failed', 'Status'):
+            table.add_column(column)
+
+        total = Counter()
+
+        for org_id, (name, status) in self.orgs.items():
+            counts = self.counts[org_id]
+            total.update(counts)
+            table.add_row(org_id, name, str(counts['listed']), str(counts['migrated']), str(counts['already_migrated']), str(counts['failed']), status)
+
+        table.add_section()
+        table.add_row('Total', f"{len(self.orgs)} orgs", str(total['listed']), str(total['migrated']), str(total['already_migrated']), str(total['failed']), '')
+
+        print(table)
+
+class ConsoleWriter:
+    """Writes per-target output from a background thread, keeping console I/O off the migration hot path
+
+    Lines are queued by the caller and written as plain text in batches. In summary mode the
+    lines are dropped and only a periodic count of the outcomes seen so far is printed.
+    """
+
+    def __init__(self, summary_only=False):
+        """
+        Args:
+            summary_only (bool, optional): Print periodic outcome counts instead of every line
+        """
+        self.summary_only = summary_only
+        self.lines = queue.SimpleQueue()
+        self.counts = Counter()
+        self.reported = Counter()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def write(self, line, outcome=None):
+        """Queue a line of output
+
+        Args:
+            line (str): Line to print
+            outcome (str, optional): Outcome the line reports, counted for the summary
+        """
+        self.lines.put((line, outcome))
+
+    def flush(self):
+        """Block until every line queued so far has been written
+        """
+        written = threading.Event()
+        self.lines.put((None, written))
+        self.wake.set()
+        written.wait()
+
+    def close(self):
+        """Write the remaining lines and stop the writer thread
+        """
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join()
+
+    def run(self):
+        """Writer thread, drains the queue every flush interval
+        """
+        interval = SNYK_CONSOLE_SUMMARY_INTERVAL if self.summary_only else SNYK_CONSOLE_FLUSH_INTERVAL
+
+        while True:
+            self.wake.wait(interval)
+            self.wake.clear()
+            stopping = self.stopped.is_set()
+            batch = []
+            written = []
+
+            while True:
+                try:
+                    line, outcome = self.lines.get_nowait()
+                except queue.Empty:
+                    break
+
+                if line is None:
+                    written.append(outcome)
+                    continue
+
+                if outcome:
+                    self.counts[outcome] += 1
+
+                if not self.summary_only:
+                    batch.append(line)
+
+            if self.summary_only and self.counts != self.reported:
+                summary = ', '.join(f"{count} {outcome.replace('_', ' ')}" for outcome, count in self.counts.items())
+
+                if state["concurrency_controller"]:
+                    summary += f", concurrency {state['concurrency_controller'].current}"
+
+                batch.append('Progress: ' + summary)
+                self.reported = self.counts.copy()
+
+            if batch:
+                sys.stdout.write('\n'.join(batch) + '\n')
+                sys.stdout.flush()
+
+            for event in written:
+                event.set()
+
+            if stopping:
+                return
+
+class MigrationProgress:
+    """Running totals behind the live progress display
+
+    Recording a result only appends to a few counters under a lock; the table is rendered
+    by the display's own refresh timer, never once per target. The total, and with it the
+    ETA, is only shown while the number of targets is known upfront.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.total = 0
+        self.sized = True
+        self.fixed = False
+        self.submitted = 0
+        self.counts = Counter()
+        self.completions = deque()
+        self.latencies = deque(maxlen=SNYK_PROGRESS_LATENCIES)
+        self.lock = threading.Lock()
+
+    def expect(self, targets):
+        """Add the number of targets about to be migrated to the total, the total becomes unknown when it is not known upfront
+
+        Args:
+            targets (iterable): Targets to be migrated
+        """
+        with self.lock:
+            if self.fixed:
+                return
+
+            if hasattr(targets, '__len__'):
+                self.total += len(targets)
+            else:
+                self.sized = False
+
+    def fix_total(self, total):
+        """Set the total from a source that knows the whole migration, later calls to expect() are ignored
+
+        Args:
+            total (int): Number of targets to be migrated
+        """
+        with self.lock:
+            self.total = total
+            self.sized = True
+            self.fixed = True
+
+    def merge(self, counts):
+        """Add outcome counts collected elsewhere, for instance in a worker process
+
+        Args:
+            counts (dict): Number of targets per outcome
+        """
+        now = time.monotonic()
+
+        with self.lock:
+            # a worker's targets are only known once it reports, unless the total was fixed
+            if not self.fixed:
+                self.sized = False
+
+            for outcome in ('migrated', 'already_migrated', 'failed'):
+                self.counts[outcome] += counts.get(outcome, 0)
+                self.completions.extend([now] * counts.get(outcome, 0))
+
+    def submit(self):
+        """Count a target handed to the migration workers
+        """
+        with self.lock:
+            self.submitted += 1
+
+    def record(self, outcome, latency=None):
+        """Count the outcome of a single target migration
+
+        Args:
+            outcome (str): 'migrated', 'already_migrated' or 'failed'
+            latency (float, optional): Seconds the migration request took
+        """
+        with self.lock:
+            self.counts[outcome] += 1
+            self.completions.append(time.monotonic())
+
+            if latency is not None:
+                self.latencies.append(latency)
+
+    def __rich__(self):
+        """Render the progress table, called by rich on every refresh
+        """
+        now = time.monotonic()
+
+        with self.lock:
+            while self.completions and self.completions[0] < now - SNYK_PROGRESS_WINDOW:
+                self.completions.popleft()
+
+            completed = sum(self.counts.values())
+            total = self.total if self.sized else None
+            window = min(SNYK_PROGRESS_WINDOW, now - self.started) or 1
+            rate = len(self.completions) / window
+            latencies = sorted(self.latencies)
+            counts = self.counts.copy()
+
+        def percentile(fraction):
+            if not latencies:
+                return '-'
+            return f"{latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000:.0f} ms"
+
+        eta = '-'
+
+        if rate and total is not None and total > completed:
+            eta = time.strftime('%H:%M:%S', time.gmtime((total - completed) / rate))
+
+        table = Table(title='Migration Progress')
+
+        for column in ('Done', 'Migrated', 'Already', 'Failed', 'Req/s', 'p50', 'p95', 'ETA'):
+            table.add_column(column)
+
+        if state["concurrency_controller"]:
+            table.add_column('Concurrency')
+
+        row = [
+            f"{completed}/{total}" if total is not None else str(completed),
+            str(counts['migrated']),
+            str(counts['already_migrated']),
+            str(counts['failed']),
+            f"{rate:.1f}",
+            percentile(0.5),
+            percentile(0.95),
+            eta
+        ]
+
+        if state["concurrency_controller"]:
+            row.append(str(state["concurrency_controller"].current))
+
+        table.add_row(*row)
+
+        return table
+
+class ResultStream:
+    """JSON Lines file receiving one record per target as soon as its outcome is known
+
+    Records are written through line by line, so the file can be followed while the run is
+    going and nothing is held in memory.
+    """
+
+    def __init__(self, path, destination):
+        """
+        Args:
+            path (str): Output file, appended to when it exists
+            destination (str): Integration the targets are migrated to
+        """
+        self.destination = destination
+        self.lock = threading.Lock()
+        self.file = open(path, 'a', encoding='utf-8', buffering=1) # pylint: disable=consider-using-with
+
+    def write(self, target, outcome, response=None, error=None):
+        """Write the record of a single target
+
+        Args:
+            target (Target): Target the record is about
+            outcome (str): 'migrated', 'already_migrated', 'failed' or 'listed' for dry runs
+            response (requests.Response, optional): response from the hidden API
+            error (Exception, optional): error raised when the request could not be sent
+        """
+        line = json.dumps({
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'org_id': target.org_id,
+            'id': target.id,
+            'name': target.display_name,
+            'origin': target.source_type,
+            'destination': self.destination,
+            'outcome': outcome,
+            'status_code': response.status_code if response is not None else None,
+            'latency': response.elapsed.total_seconds() if response is not None else None,
+            'request_id': response.headers.get('snyk-request-id') if response is not None else None,
+            'attempts': getattr(response, 'attempts', None),
+            'error': str(error) if error is not None else None
+        })
+
+        with self.lock:
+            self.file.write(line + '\n')
+
+    def close(self):
+        """Close the output file
+        """
+        with self.lock:
+            self.file.close()
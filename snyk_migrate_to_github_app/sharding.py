@@ -0,0 +1,77 @@
+"""Deterministic partitioning of a migration between several runs
+"""
+
+# ===== IMPORTS =====
+
+import hashlib
+
+from rich import print
+
+# ===== METHODS =====
+
+def parse_shard(shard):
+    """Parse an INDEX/COUNT shard option
+
+    Args:
+        shard (str): Shard option, e.g. '0/4'
+
+    Returns:
+        tuple: index and count, None when the option is empty or invalid
+    """
+    index, _, count = shard.partition('/')
+
+    if not index.isdigit() or not count.isdigit() or int(index) >= int(count):
+        return None
+
+    return int(index), int(count)
+
+def in_shard(key, index, count):
+    """Whether an ID belongs to a shard, stable across runs and machines
+
+    Args:
+        key (str): Target or org ID
+        index (int): Index of the shard
+        count (int): Number of shards
+
+    Returns:
+        bool: True when the shard owns the ID
+    """
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], 'big') % count == index
+
+def shard_targets(targets, shard):
+    """Leave out targets owned by another shard
+
+    Args:
+        targets (iterable): Targets to be migrated
+        shard (tuple): Index, count and 'target' or 'org', None when the run is not sharded
+
+    Returns:
+        iterable: targets owned by this run
+    """
+    if not shard or shard[2] != 'target':
+        return targets
+
+    index, count, _ = shard
+
+    return (target for target in targets if in_shard(target.id, index, count))
+
+def shard_orgs(orgs, shard):
+    """Leave out orgs owned by another shard
+
+    Args:
+        orgs (list): (org ID, org name) of the orgs in a group
+        shard (tuple): Index, count and 'target' or 'org', None when the run is not sharded
+
+    Returns:
+        list: orgs owned by this run
+    """
+    if not shard or shard[2] != 'org':
+        return orgs
+
+    index, count, _ = shard
+    owned = [org for org in orgs if in_shard(org[0], index, count)]
+
+    if orgs and not owned:
+        print(f"None of the {len(orgs)} organizations belong to shard {index}/{count}")
+
+    return owned
@@ -0,0 +1,24 @@
+"""State shared by every module of a run
+"""
+
+# ===== IMPORTS =====
+
+from rich import print
+
+# ===== GLOBALS =====
+
+state = {"verbose": False, "rate_limiter": None, "concurrency_controller": None, "retry_policy": None, "journal": None, "summary": None, "shard": None, "work_queue": None, "plan": None, "console": None, "results": None, "progress": None, "metrics": None, "metrics_textfile": None, "tracer": None, "profiler": None}
+
+# ===== METHODS =====
+
+def output(line, outcome=None):
+    """Print a per-target or per-request line, through the buffered console writer when one is configured
+
+    Args:
+        line (str): Line to print
+        outcome (str, optional): Outcome the line reports
+    """
+    if state["console"]:
+        state["console"].write(line, outcome)
+    else:
+        print(line)
@@ -0,0 +1,40 @@
+"""Compact record of a Snyk target
+"""
+
+# ===== IMPORTS =====
+
+from dataclasses import dataclass
+
+# ===== CLASSES =====
+
+@dataclass(frozen=True, slots=True)
+class Target:
+    """The few fields of a Snyk target the migration needs, extracted from its JSON:API object
+    """
+    id: str
+    display_name: str
+    source_type: str
+    url: str = ''
+    org_id: str = ''
+
+    @classmethod
+    def from_json(cls, data, origin='', org_id=''):
+        """Build a Target from a REST API target object
+
+        Args:
+            data (dict): Target object as returned by the REST /targets endpoint
+            origin (str, optional): Origin the target was listed with, used when the object lacks it
+            org_id (str, optional): Snyk Organization ID the target was listed from
+
+        Returns:
+            Target: compact target record
+        """
+        attributes = data.get('attributes', {})
+        integration = data.get('relationships', {}).get('integration', {}).get('data', {})
+
+        return cls(
+            id=data['id'],
+            display_name=attributes.get('display_name', ''),
+            source_type=integration.get('attributes', {}).get('integration_type', origin),
+            url=attributes.get('url') or '',
+            org_id=org_id)
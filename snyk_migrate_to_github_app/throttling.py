@@ -0,0 +1,276 @@
+"""Rate limiting, retries and adaptive concurrency of Snyk API requests
+"""
+
+# ===== IMPORTS =====
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+from snyk_migrate_to_github_app.constants import SNYK_RATE_LIMIT_DEFAULT, SNYK_RATE_LIMIT_FLOOR, SNYK_RATE_LIMIT_RECOVERY, SNYK_RATE_LIMIT_COOLDOWN, SNYK_RATE_LIMIT_PAUSE_MAX, SNYK_RATE_LIMIT_EPOCH, SNYK_RETRY_ATTEMPTS, SNYK_RETRY_BACKOFF_BASE, SNYK_RETRY_BACKOFF_MAX, SNYK_RETRY_STATUSES, SNYK_AIMD_START, SNYK_AIMD_DECREASE, SNYK_AIMD_LATENCY_FACTOR, SNYK_AIMD_SMOOTHING, SNYK_AIMD_COOLDOWN
+from snyk_migrate_to_github_app.state import state, output
+
+# ===== CLASSES =====
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """How often and how patiently a failed API request is sent again
+    """
+    max_attempts: int = SNYK_RETRY_ATTEMPTS
+    base_delay: float = SNYK_RETRY_BACKOFF_BASE
+    max_delay: float = SNYK_RETRY_BACKOFF_MAX
+    retryable_statuses: frozenset = SNYK_RETRY_STATUSES
+
+    def backoff(self, attempt):
+        """Seconds to wait before sending a request again, capped exponential backoff with full jitter
+
+        Args:
+            attempt (int): Number of the attempt that just failed, starting at 1
+
+        Returns:
+            float: seconds to wait
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class RateLimiter:
+    """Token bucket shared by every API call in a run
+
+    The bucket refills at the configured rate. A 429 response halves the rate, at most once
+    per cooldown so a burst of concurrent 429s counts as one, and pauses every caller until
+    the time given by Retry-After (or the rate-limit reset headers) has passed. Every success
+    then wins back a share of the lost rate, so recovery is quick after a deep cut.
+    """
+
+    def __init__(self, rate=SNYK_RATE_LIMIT_DEFAULT):
+        """
+        Args:
+            rate (float, optional): Maximum requests per second, 0 only slows down once throttled
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.tokens = max(rate, 1)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.last_decrease = float('-inf')
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent
+
+        Returns:
+            float: seconds spent waiting
+        """
+        waited = 0.0
+
+        while delay := self.reserve():
+            time.sleep(delay)
+            waited += delay
+
+        return waited
+
+    async def acquire_async(self):
+        """Wait on the event loop until a request may be sent
+
+        Returns:
+            float: seconds spent waiting
+        """
+        waited = 0.0
+
+        while delay := self.reserve():
+            await asyncio.sleep(delay)
+            waited += delay
+
+        return waited
+
+    def reserve(self):
+        """Take a token when a request may be sent right away
+
+        Returns:
+            float: seconds to wait before trying again, 0 when a token was taken
+        """
+        with self.lock:
+            now = time.monotonic()
+
+            if self.rate:
+                self.tokens = min(self.tokens + (now - self.updated) * self.rate, max(self.rate, 1))
+            self.updated = now
+
+            if now < self.paused_until:
+                return self.paused_until - now
+            if not self.rate:
+                return 0
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+
+            return (1 - self.tokens) / self.rate
+
+    def update(self, response):
+        """Adjust the rate after a response came back
+
+        Args:
+            response (requests.Response): response from the Snyk API
+
+        Returns:
+            bool: True when the response was throttled
+        """
+        delay = retry_after(response)
+
+        decreased = False
+
+        with self.lock:
+            now = time.monotonic()
+
+            if response.status_code == 429:
+                self.tokens = 0
+
+                if now - self.last_decrease >= SNYK_RATE_LIMIT_COOLDOWN:
+                    self.rate = max(SNYK_RATE_LIMIT_FLOOR, (self.rate or self.max_rate or SNYK_RATE_LIMIT_DEFAULT) / 2)
+                    self.last_decrease = now
+                    decreased = True
+            elif self.max_rate:
+                self.rate = min(self.max_rate, self.rate + (self.max_rate - self.rate) * SNYK_RATE_LIMIT_RECOVERY)
+            elif self.rate:
+                # without a configured rate there is nothing to return to, keep speeding up until throttled again
+                self.rate = self.rate * (1 + SNYK_RATE_LIMIT_RECOVERY)
+
+            if delay:
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+        if decreased and state["verbose"]:
+            output(f"Rate limited by the Snyk API, slowing down to {self.rate:.1f} requests per second")
+
+        return response.status_code == 429
+
+class ConcurrencyController:
+    """AIMD limit on the number of migration requests in flight
+
+    Every healthy response grows the limit by one request per window (additive increase).
+    A throttled or failed response, or latency well above the best seen so far, halves it
+    (multiplicative decrease), at most once per cooldown period.
+    """
+
+    def __init__(self, maximum, initial=SNYK_AIMD_START):
+        """
+        Args:
+            maximum (int): Upper bound for the number of requests in flight
+            initial (int, optional): Number of requests in flight to start with
+        """
+        self.maximum = maximum
+        self.limit = float(min(maximum, initial))
+        self.in_flight = 0
+        self.latency = None
+        self.best_latency = None
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+        self.waiters = deque()
+
+    @property
+    def current(self):
+        """int: number of requests currently allowed in flight"""
+        return int(self.limit)
+
+    def acquire(self):
+        """Block until another request may be sent
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        """Wait on the event loop until another request may be sent
+        """
+        loop = asyncio.get_running_loop()
+
+        while True:
+            with self.condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+
+                waiter = loop.create_future()
+                self.waiters.append(waiter)
+
+            await waiter
+
+    def release(self, latency, healthy):
+        """Record the outcome of a request and adjust the limit
+
+        Args:
+            latency (float): Seconds the request spent on the network
+            healthy (bool): False when the request was throttled, failed or hit a server error
+        """
+        with self.condition:
+            previous = self.current
+            self.in_flight -= 1
+
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += SNYK_AIMD_SMOOTHING * (latency - self.latency)
+
+            if self.best_latency is None or self.latency < self.best_latency:
+                self.best_latency = self.latency
+
+            now = time.monotonic()
+
+            if not healthy or self.latency > SNYK_AIMD_LATENCY_FACTOR * self.best_latency:
+                if now - self.last_decrease > max(SNYK_AIMD_COOLDOWN, self.latency):
+                    self.limit = max(1.0, self.limit * SNYK_AIMD_DECREASE)
+                    self.last_decrease = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+            self.condition.notify_all()
+
+            # coroutines waiting in acquire_async run on the loop that releases them
+            while self.waiters:
+                waiter = self.waiters.popleft()
+
+                if not waiter.done():
+                    waiter.set_result(None)
+
+            # the level is shown by the progress display and the periodic summary, every change only when verbose
+            if self.current != previous and state["verbose"] and not state["progress"]:
+                output(f"Concurrency adjusted to {self.current}")
+
+# ===== METHODS =====
+
+def retry_after(response):
+    """Number of seconds the Snyk API asked us to wait before the next request
+
+    Retry-After holds seconds or an HTTP date. Once the rate-limit headers report no
+    remaining requests, their reset value is used instead, in seconds or, as many servers
+    send it, as a Unix timestamp. The pause is capped, so a misread header cannot stall
+    the run.
+
+    Args:
+        response (requests.Response): response from the Snyk API
+
+    Returns:
+        float: seconds to wait, 0 when the response does not ask for a pause
+    """
+    value = response.headers.get('Retry-After')
+
+    if value is None and response.headers.get('X-RateLimit-Remaining', response.headers.get('RateLimit-Remaining')) == '0':
+        value = response.headers.get('X-RateLimit-Reset', response.headers.get('RateLimit-Reset'))
+
+    if not value:
+        return 0
+
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return 0
+    else:
+        if delay > SNYK_RATE_LIMIT_EPOCH:
+            delay -= time.time()
+
+    return min(max(0.0, delay), SNYK_RATE_LIMIT_PAUSE_MAX)
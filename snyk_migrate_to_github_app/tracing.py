@@ -0,0 +1,196 @@
+"""Tracing spans of a run, written to a file as OTLP JSON
+"""
+
+# ===== IMPORTS =====
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from snyk_migrate_to_github_app.constants import SNYK_TRACE_BATCH
+from snyk_migrate_to_github_app.state import state
+
+# ===== GLOBALS =====
+
+current_span = contextvars.ContextVar('current_span', default=None)
+
+# ===== CLASSES =====
+
+class Tracer:
+    """Records spans for the phases, targets and API requests of a run and appends them to a file as OTLP JSON
+
+    Every line of the file is an OTLP/JSON ExportTraceServiceRequest holding a batch of spans,
+    the format written by the OpenTelemetry Collector file exporter. The run itself is the root
+    span, worker processes append their spans to the same file as children of it.
+    """
+
+    def __init__(self, path, trace_id='', parent_id=''):
+        """
+        Args:
+            path (str): File the spans are appended to
+            trace_id (str, optional): Trace to join, a new trace with its own root span is started when empty
+            parent_id (str, optional): Span every span without another parent belongs to
+        """
+        self.path = path
+        self.trace_id = trace_id or os.urandom(16).hex()
+        self.spans = []
+        self.lock = threading.Lock()
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND | (0 if trace_id else os.O_TRUNC), 0o644)
+        self.root = None
+        self.parent_id = parent_id
+
+        if not trace_id:
+            self.root = self.start('snyk-migrate-to-github-app', parent_id='')
+            self.parent_id = self.root['spanId']
+
+    def start(self, name, kind=1, parent_id=None, **attributes):
+        """Open a span
+
+        Args:
+            name (str): Span name
+            kind (int, optional): OTLP span kind, 1 for internal and 3 for client spans
+            parent_id (str, optional): Parent span ID, defaults to the current span of the caller
+            **attributes: Span attributes
+
+        Returns:
+            dict: the span, attributes and status may be changed until it ends
+        """
+        if parent_id is None:
+            parent = current_span.get()
+            parent_id = parent['spanId'] if parent else self.parent_id
+
+        return {
+            'traceId': self.trace_id,
+            'spanId': os.urandom(8).hex(),
+            'parentSpanId': parent_id,
+            'name': name,
+            'kind': kind,
+            'startTimeUnixNano': time.time_ns(),
+            'attributes': attributes
+        }
+
+    def end(self, span):
+        """Close a span and queue it for the trace file
+
+        Args:
+            span (dict): Span returned by start()
+        """
+        span['endTimeUnixNano'] = time.time_ns()
+
+        with self.lock:
+            self.spans.append(span)
+            full = len(self.spans) >= SNYK_TRACE_BATCH
+
+        if full:
+            self.flush()
+
+    @contextmanager
+    def span(self, name, kind=1, **attributes):
+        """Context manager running its block as a span, the current span of everything called from it
+
+        Args:
+            name (str): Span name
+            kind (int, optional): OTLP span kind, 1 for internal and 3 for client spans
+            **attributes: Span attributes
+
+        Yields:
+            dict: the span
+        """
+        span = self.start(name, kind, **attributes)
+        token = current_span.set(span)
+
+        try:
+            yield span
+        except BaseException as exc:
+            span['status'] = {'code': 2, 'message': str(exc) or type(exc).__name__}
+            raise
+        finally:
+            current_span.reset(token)
+            self.end(span)
+
+    def flush(self):
+        """Append the finished spans to the trace file as one line
+        """
+        with self.lock:
+            spans, self.spans = self.spans, []
+
+        if not spans:
+            return
+
+        def value(attribute):
+            if isinstance(attribute, bool):
+                return {'boolValue': attribute}
+            if isinstance(attribute, int):
+                return {'intValue': str(attribute)}
+            if isinstance(attribute, float):
+                return {'doubleValue': attribute}
+            return {'stringValue': str(attribute)}
+
+        def encode(attributes):
+            return [{'key': key, 'value': value(attribute)} for key, attribute in attributes.items()]
+
+        line = json.dumps({
+            'resourceSpans': [{
+                'resource': {'attributes': encode({'service.name': 'snyk-migrate-to-github-app', 'process.pid': os.getpid()})},
+                'scopeSpans': [{
+                    'scope': {'name': __name__},
+                    'spans': [
+                        dict(
+                            {key: span[key] for key in span if key != 'parentSpanId' or span[key]},
+                            startTimeUnixNano=str(span['startTimeUnixNano']),
+                            endTimeUnixNano=str(span['endTimeUnixNano']),
+                            attributes=encode(span['attributes']))
+                        for span in spans
+                    ]
+                }]
+            }]
+        })
+
+        # a single O_APPEND write keeps lines from several processes whole
+        os.write(self.fd, (line + '\n').encode('utf-8'))
+
+    def close(self):
+        """End the root span and write every remaining span
+        """
+        if self.root:
+            self.end(self.root)
+            self.root = None
+
+        self.flush()
+        os.close(self.fd)
+
+# ===== METHODS =====
+
+def trace(name, **attributes):
+    """Span for a phase of the run, doing nothing when the run is not traced
+
+    Args:
+        name (str): Span name
+        **attributes: Span attributes
+
+    Returns:
+        contextmanager: yielding the span
+    """
+    if not state["tracer"]:
+        return nullcontext({'attributes': {}})
+
+    return state["tracer"].span(name, **attributes)
+
+def in_context(function):
+    """Bind a function to the caller's context, so spans it opens on another thread keep their parent
+
+    Args:
+        function (callable): Function to run on another thread
+
+    Returns:
+        callable: function running in a copy of the caller's context on every call
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+
+    return run
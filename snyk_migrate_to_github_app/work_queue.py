@@ -0,0 +1,155 @@
+"""SQLite work queue shared by the worker processes of a machine
+"""
+
+# ===== IMPORTS =====
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from snyk_migrate_to_github_app.constants import SNYK_QUEUE_LEASE_TIMEOUT, SNYK_QUEUE_DB_TIMEOUT
+from snyk_migrate_to_github_app.target import Target
+
+# ===== CLASSES =====
+
+class WorkQueue:
+    """SQLite-backed queue of targets that worker processes on one machine lease batches from
+
+    A leased target belongs to its worker until the lease times out, after which any worker
+    may lease it again, so targets held by a crashed worker are not lost. A live worker renews
+    its leases while it works on them, and only the worker holding a lease can complete it.
+    """
+
+    def __init__(self, path, worker='', lease_timeout=SNYK_QUEUE_LEASE_TIMEOUT):
+        """
+        Args:
+            path (str): SQLite file holding the queue, created when missing
+            worker (str, optional): Name the targets are leased under, defaults to host and process ID
+            lease_timeout (float, optional): Seconds before a leased target can be leased again
+        """
+        self.worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_timeout = lease_timeout
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=SNYK_QUEUE_DB_TIMEOUT, isolation_level=None, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS targets (
+                id TEXT PRIMARY KEY,
+                org_id TEXT NOT NULL,
+                display_name TEXT NOT NULL,
+                source_type TEXT NOT NULL,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                outcome TEXT
+            )""")
+
+    def put(self, targets):
+        """Add targets to the queue, targets already queued are left untouched
+
+        Args:
+            targets (iterable): Targets to be migrated
+
+        Returns:
+            int: number of targets added
+        """
+        with self.lock:
+            cursor = self.connection.executemany(
+                'INSERT OR IGNORE INTO targets (id, org_id, display_name, source_type, url) VALUES (?, ?, ?, ?, ?)',
+                ((target.id, target.org_id, target.display_name, target.source_type, target.url) for target in targets))
+
+            return cursor.rowcount
+
+    def retry_failed(self):
+        """Make the targets that failed pending again, so the next lease hands them out
+
+        Returns:
+            int: number of targets queued again
+        """
+        with self.lock:
+            return self.connection.execute(
+                "UPDATE targets SET status = 'pending', worker = NULL, outcome = NULL WHERE status = 'failed'").rowcount
+
+    def lease(self, count):
+        """Take up to count pending targets, or targets whose lease has expired
+
+        Args:
+            count (int): Maximum number of targets to lease
+
+        Returns:
+            list[Target]: leased targets, empty when the queue is drained
+        """
+        now = time.time()
+
+        with self.lock:
+            self.connection.execute('BEGIN IMMEDIATE')
+
+            try:
+                rows = self.connection.execute(
+                    "SELECT id, display_name, source_type, url, org_id FROM targets "
+                    "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) LIMIT ?",
+                    (now, count)).fetchall()
+
+                self.connection.executemany(
+                    "UPDATE targets SET status = 'leased', worker = ?, lease_expires = ? WHERE id = ?",
+                    ((self.worker, now + self.lease_timeout, row[0]) for row in rows))
+
+                self.connection.execute('COMMIT')
+            except sqlite3.Error:
+                self.connection.execute('ROLLBACK')
+                raise
+
+        return [Target(*row) for row in rows]
+
+    def renew(self):
+        """Extend the leases this worker holds, so targets still being migrated are not handed out again
+
+        Returns:
+            int: number of leases renewed
+        """
+        with self.lock:
+            return self.connection.execute(
+                "UPDATE targets SET lease_expires = ? WHERE status = 'leased' AND worker = ?",
+                (time.time() + self.lease_timeout, self.worker)).rowcount
+
+    def complete(self, target, outcome):
+        """Record the outcome of a target leased by this worker
+
+        Args:
+            target (Target): Target that was migrated
+            outcome (str): 'migrated', 'already_migrated' or 'failed'
+
+        Returns:
+            bool: False when the lease was lost to another worker, whose outcome is kept
+        """
+        with self.lock:
+            return self.connection.execute(
+                "UPDATE targets SET status = ?, outcome = ?, lease_expires = NULL WHERE id = ? AND status = 'leased' AND worker = ?",
+                ('failed' if outcome == 'failed' else 'done', outcome, target.id, self.worker)).rowcount == 1
+
+    def outcomes(self):
+        """Number of completed targets per outcome
+
+        Returns:
+            Counter: outcome to number of targets
+        """
+        with self.lock:
+            return Counter(dict(self.connection.execute('SELECT outcome, COUNT(*) FROM targets WHERE outcome IS NOT NULL GROUP BY outcome').fetchall()))
+
+    def counts(self):
+        """Number of targets in each status
+
+        Returns:
+            dict: status to number of targets
+        """
+        with self.lock:
+            return dict(self.connection.execute('SELECT status, COUNT(*) FROM targets GROUP BY status').fetchall())
+
+    def close(self):
+        """Close the queue database
+        """
+        self.connection.close()
@@ -0,0 +1,154 @@
+"""Tests for the requests sent to the Snyk APIs
+"""
+
+import json
+
+import pytest
+import requests
+
+from snyk_migrate_to_github_app.api import TargetListingError, exclude_migrated, get_migrated_index, get_target_pages, send_request
+from snyk_migrate_to_github_app.state import state
+from snyk_migrate_to_github_app.target import Target
+from snyk_migrate_to_github_app.throttling import RetryPolicy
+
+
+class FakeSession:
+    """Session answering every request with the next of a list of responses, or raising it when it is an exception
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, **_kwargs):
+        self.requests.append((method, url))
+        response = self.responses.pop(0)
+
+        if isinstance(response, Exception):
+            raise response
+
+        return response
+
+
+def make_response(status_code=200, body=None, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    response._content = json.dumps(body or {}).encode() # pylint: disable=protected-access
+    return response
+
+
+def targets_page(ids, next_url=''):
+    return make_response(200, {
+        'data': [{'id': target_id, 'attributes': {'display_name': f'acme/{target_id}'}} for target_id in ids],
+        'links': {'next': next_url} if next_url else {}
+    })
+
+
+@pytest.fixture(autouse=True)
+def retry_policy(monkeypatch):
+    monkeypatch.setitem(state, 'retry_policy', RetryPolicy(max_attempts=2, base_delay=0))
+
+
+
+@pytest.fixture
+def three_attempts(monkeypatch):
+    monkeypatch.setitem(state, 'retry_policy', RetryPolicy(max_attempts=3, base_delay=0))
+
+
+@pytest.mark.usefixtures('three_attempts')
+def test_send_request_retries_retryable_statuses():
+    session = FakeSession(make_response(503), requests.ConnectionError('reset'), make_response(200))
+
+    response = send_request(session, 'GET', 'https://api.snyk.io/rest/orgs/org/targets')
+
+    assert response.status_code == 200
+    assert response.attempts == 3
+    assert len(session.requests) == 3
+
+
+@pytest.mark.usefixtures('three_attempts')
+def test_send_request_returns_the_last_response_after_max_attempts():
+    session = FakeSession(make_response(503), make_response(502), make_response(503), make_response(200))
+
+    response = send_request(session, 'GET', 'https://api.snyk.io/rest/orgs/org/targets')
+
+    assert response.status_code == 503
+    assert response.attempts == 3
+    assert len(session.requests) == 3
+
+
+@pytest.mark.usefixtures('three_attempts')
+def test_send_request_raises_once_the_connection_errors_are_used_up():
+    session = FakeSession(*[requests.ConnectionError('refused')] * 3)
+
+    with pytest.raises(requests.ConnectionError, match='refused'):
+        send_request(session, 'GET', 'https://api.snyk.io/rest/orgs/org/targets')
+
+    assert len(session.requests) == 3
+
+
+@pytest.mark.usefixtures('three_attempts')
+def test_send_request_does_not_retry_other_errors():
+    session = FakeSession(make_response(404), requests.exceptions.InvalidURL('bad'))
+
+    assert send_request(session, 'GET', 'https://api.snyk.io/rest/orgs/org/targets').attempts == 1
+
+    with pytest.raises(requests.exceptions.InvalidURL):
+        send_request(session, 'GET', 'https://api.snyk.io/rest/orgs/org/targets')
+
+    assert len(session.requests) == 2
+
+def test_target_pages_follow_the_cursor():
+    session = FakeSession(targets_page(['a', 'b'], '/rest/orgs/org/targets?starting_after=b'), targets_page(['c']))
+
+    pages = list(get_target_pages('token', 'org', session=session))
+
+    assert [[target.id for target in page] for page in pages] == [['a', 'b'], ['c']]
+    assert session.requests[1][1].endswith('/rest/orgs/org/targets?starting_after=b')
+
+
+def test_failed_page_raises_instead_of_ending_the_listing():
+    session = FakeSession(targets_page(['a'], '/rest/orgs/org/targets?starting_after=a'), make_response(503), make_response(503))
+    pages = get_target_pages('token', 'org', session=session)
+
+    assert [target.id for target in next(pages)] == ['a']
+
+    with pytest.raises(TargetListingError, match='github-enterprise targets: 503'):
+        next(pages)
+
+
+def test_unreachable_page_raises():
+    session = FakeSession(requests.ConnectionError('refused'), requests.ConnectionError('refused'))
+
+    with pytest.raises(TargetListingError, match='refused'):
+        list(get_target_pages('token', 'org', session=session))
+
+
+def migrated_index(*targets):
+    session = FakeSession(make_response(200, {
+        'data': [{'id': target_id, 'attributes': {'display_name': name, 'url': url}} for target_id, name, url in targets]
+    }))
+
+    return get_migrated_index('token', 'org', session=session)
+
+
+def test_repositories_are_matched_on_their_url():
+    index = migrated_index(('app-1', 'acme/api', 'https://github.example.com/acme/api.git'))
+    targets = [
+        Target('same-url', 'acme/api', 'github-enterprise', url='https://GITHUB.example.com/acme/api/'),
+        Target('same-name-other-host', 'acme/api', 'github-enterprise', url='https://github.other.com/acme/api'),
+    ]
+
+    assert [target.id for target in exclude_migrated(targets, index)] == ['same-name-other-host']
+
+
+def test_repositories_without_a_url_are_matched_on_their_name():
+    index = migrated_index(('app-1', 'acme/api', ''), ('app-2', 'acme/web', 'https://github.com/acme/web'))
+    targets = [
+        Target('url-matches-name-only', 'acme/api', 'github-enterprise', url='https://github.example.com/acme/api'),
+        Target('no-url', 'ACME/web', 'github-enterprise'),
+        Target('unmigrated', 'acme/cli', 'github-enterprise'),
+    ]
+
+    assert [target.id for target in exclude_migrated(targets, index)] == ['unmigrated']
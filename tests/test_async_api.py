@@ -0,0 +1,182 @@
+"""Tests for the asyncio request path
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from snyk_migrate_to_github_app.api import TargetListingError
+from snyk_migrate_to_github_app.async_api import get_target_pages_async, migrate_target_async, send_request_async
+from snyk_migrate_to_github_app.async_migration import migrate_targets_async, round_robin_async
+from snyk_migrate_to_github_app.reporting import MigrationSummary
+from snyk_migrate_to_github_app.state import state
+from snyk_migrate_to_github_app.target import Target
+from snyk_migrate_to_github_app.throttling import ConcurrencyController, RateLimiter, RetryPolicy
+
+URL = 'https://api.snyk.io/rest/orgs/org/targets'
+
+
+@pytest.fixture(autouse=True)
+def retry_policy(monkeypatch):
+    monkeypatch.setitem(state, 'retry_policy', RetryPolicy(max_attempts=3, base_delay=0))
+
+
+def client_answering(*responses):
+    """Client answering every request with the next of a list of responses, or raising it when it is an exception
+    """
+    responses = list(responses)
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        response = responses.pop(0)
+
+        if isinstance(response, Exception):
+            raise response
+
+        return response
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), sent
+
+
+def targets_page(ids, next_url=''):
+    return httpx.Response(200, json={
+        'data': [{'id': target_id, 'attributes': {'display_name': f'acme/{target_id}'}} for target_id in ids],
+        'links': {'next': next_url} if next_url else {}
+    })
+
+
+def test_send_request_retries_on_the_event_loop():
+    client, sent = client_answering(httpx.Response(503), httpx.ConnectError('refused'), httpx.Response(200))
+
+    response = asyncio.run(send_request_async(client, 'GET', URL))
+
+    assert response.status_code == 200
+    assert response.attempts == 3
+    assert len(sent) == 3
+
+
+def test_send_request_raises_once_the_connection_errors_are_used_up():
+    client, sent = client_answering(*[httpx.ConnectError('refused')] * 3)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(send_request_async(client, 'GET', URL))
+
+    assert len(sent) == 3
+
+
+def test_target_pages_follow_the_cursor_and_raise_on_a_failed_page():
+    client, sent = client_answering(
+        targets_page(['a', 'b'], '/rest/orgs/org/targets?starting_after=b'),
+        targets_page(['c'], '/rest/orgs/org/targets?starting_after=c'),
+        *[httpx.Response(503)] * 3)
+
+    async def list_pages():
+        pages = []
+
+        with pytest.raises(TargetListingError, match='github-enterprise targets: 503'):
+            async for page in get_target_pages_async(client, 'token', 'org'):
+                pages.append([target.id for target in page])
+
+        return pages
+
+    assert asyncio.run(list_pages()) == [['a', 'b'], ['c']]
+    assert sent[1].url.path.endswith('/rest/orgs/org/targets')
+    assert sent[1].url.params['starting_after'] == 'b'
+
+
+def test_migrate_target_sends_the_hidden_api_request():
+    client, sent = client_answering(httpx.Response(200))
+    target = Target('target-1', 'acme/api', 'github-enterprise', org_id='org-a')
+
+    response = asyncio.run(migrate_target_async(client, 'token', None, target, 'github-cloud-app'))
+
+    assert response.status_code == 200
+    assert sent[0].method == 'PATCH'
+    assert sent[0].url.path == '/hidden/orgs/org-a/targets/target-1'
+    assert json.loads(sent[0].content)['data']['attributes']['source_type'] == 'github-cloud-app'
+
+
+def test_migrate_targets_reports_every_outcome(monkeypatch):
+    summary = MigrationSummary()
+    monkeypatch.setitem(state, 'summary', summary)
+
+    def handler(request):
+        target_id = request.url.path.rsplit('/', 1)[1]
+        return httpx.Response({'target-0': 409, 'target-1': 500}.get(target_id, 200))
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    targets = [Target(f'target-{index}', f'acme/repo-{index}', 'github-enterprise', org_id='org') for index in range(10)]
+
+    asyncio.run(migrate_targets_async(client, 'token', 'org', targets, concurrency=3))
+
+    assert summary.counts['org'] == {'migrated': 8, 'already_migrated': 1, 'failed': 1}
+
+
+def test_round_robin_interleaves_the_listed_orgs():
+    async def listed(targets):
+        return targets
+
+    async def collect():
+        tasks = [asyncio.create_task(listed(['a1', 'a2', 'a3'])), asyncio.create_task(listed(['b1', 'b2']))]
+        await asyncio.wait(tasks)
+        return [target async for target in round_robin_async(tasks)]
+
+    targets = asyncio.run(collect())
+
+    assert sorted(targets) == ['a1', 'a2', 'a3', 'b1', 'b2']
+    assert ''.join(target[0] for target in targets) in ('ababa', 'babaa')
+
+
+def test_round_robin_starts_before_every_org_is_listed():
+    async def listed(targets, delay):
+        await asyncio.sleep(delay)
+        return targets
+
+    async def collect():
+        slow = asyncio.create_task(listed(['b1'], 0.05))
+        first = await anext(round_robin_async([asyncio.create_task(listed(['a1'], 0)), slow]))
+        return first, slow.done()
+
+    assert asyncio.run(collect()) == ('a1', False)
+
+
+def test_concurrency_controller_wakes_coroutines_waiting_for_a_slot():
+    controller = ConcurrencyController(1, initial=1)
+
+    async def hold(log, name):
+        await controller.acquire_async()
+        log.append(name)
+        await asyncio.sleep(0.01)
+        controller.release(0.01, True)
+
+    async def run():
+        log = []
+        await asyncio.wait_for(asyncio.gather(*(hold(log, name) for name in 'abc')), timeout=1)
+        return log
+
+    assert asyncio.run(run()) == ['a', 'b', 'c']
+    assert controller.in_flight == 0
+
+
+def test_rate_limiter_waits_without_blocking_the_event_loop():
+    limiter = RateLimiter(1000)
+    limiter.paused_until = limiter.updated + 0.1
+
+    async def run():
+        ticks = []
+
+        async def tick():
+            for _ in range(5):
+                ticks.append(None)
+                await asyncio.sleep(0.01)
+
+        waited, _ = await asyncio.gather(limiter.acquire_async(), tick())
+        return waited, len(ticks)
+
+    waited, ticks = asyncio.run(run())
+
+    assert waited >= 0.05
+    assert ticks == 5
@@ -0,0 +1,25 @@
+"""Tests for --count-only
+"""
+
+import requests
+
+from snyk_migrate_to_github_app import main
+
+
+def test_org_that_cannot_be_counted_is_an_error_row(monkeypatch, capsys):
+    def get_target_count(_snyk_token, org_id, **_kwargs):
+        if org_id == 'org-b':
+            raise requests.ConnectionError('refused')
+        return 3
+
+    monkeypatch.setattr(main, 'get_group_orgs', lambda *_args, **_kwargs: [('org-a', 'A'), ('org-b', 'B'), ('org-c', 'C')])
+    monkeypatch.setattr(main, 'get_target_count', get_target_count)
+    monkeypatch.setitem(main.state, 'shard', None)
+
+    main.count_targets('token', 'group', ['github-enterprise'], group=True)
+
+    rows = {line.split()[1]: line for line in capsys.readouterr().out.splitlines() if line.startswith('│')}
+
+    assert 'error: refused' in rows['org-b']
+    assert '3' in rows['org-a'] and '3' in rows['org-c']
+    assert '6' in rows['Total'] and '1 not counted' in rows['Total']
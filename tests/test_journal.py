@@ -0,0 +1,39 @@
+"""Tests for the checkpoint journal
+"""
+
+from snyk_migrate_to_github_app.journal import Journal
+from snyk_migrate_to_github_app.target import Target
+
+
+def test_load_skips_a_truncated_last_line(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = Journal(str(path))
+
+    for target_id, outcome in (('a', 'migrated'), ('b', 'already_migrated'), ('c', 'failed')):
+        journal.record(Target(target_id, f'acme/{target_id}', 'github-enterprise'), outcome)
+
+    journal.close()
+
+    # a process killed in the middle of a write leaves half a record behind
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write('{"target_id": "d", "outc')
+
+    assert Journal.load(str(path)) == {'a', 'b'}
+
+
+def test_load_of_a_missing_journal_is_empty(tmp_path):
+    assert Journal.load(str(tmp_path / 'missing.jsonl')) == set()
+
+
+def test_resume_appends_to_the_journal(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = Journal(path)
+    journal.record(Target('a', 'acme/a', 'github-enterprise'), 'migrated')
+    journal.close()
+
+    resumed = Journal(path, resume=True)
+    resumed.record(Target('b', 'acme/b', 'github-enterprise'), 'migrated')
+    resumed.close()
+
+    assert resumed.completed == {'a'}
+    assert Journal.load(path) == {'a', 'b'}
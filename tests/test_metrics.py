@@ -0,0 +1,77 @@
+"""Tests for the request metrics
+"""
+
+import pytest
+
+from snyk_migrate_to_github_app import main
+from snyk_migrate_to_github_app.metrics import RequestMetrics
+from snyk_migrate_to_github_app.state import state
+
+PATCH_URL = 'https://api.snyk.io/hidden/orgs/org/targets/target?version=2023-04-02~experimental'
+
+
+@pytest.fixture
+def worker_state(monkeypatch):
+    monkeypatch.setitem(state, 'metrics', RequestMetrics())
+    monkeypatch.setitem(state, 'summary', None)
+
+
+def test_record_counts_requests_per_endpoint():
+    metrics = RequestMetrics()
+    metrics.record('PATCH', PATCH_URL, 0.02, status='200', size=10)
+    metrics.record('PATCH', PATCH_URL, 0.3, status='429', retry=True, waited=1.5)
+    metrics.record('GET', 'https://api.snyk.io/rest/orgs/org/targets', 0.1, status='200')
+
+    report = metrics.report()
+    patch = report['PATCH /hidden/orgs/{org_id}/targets/{target_id}']
+
+    assert patch['count'] == 2
+    assert patch['error_rate'] == 0.5
+    assert patch['retries'] == 1
+    assert patch['rate_limit_wait'] == 1.5
+    assert patch['statuses'] == {'200': 1, '429': 1}
+    assert report['GET /rest/orgs/{org_id}/targets']['count'] == 1
+
+
+def test_drain_only_returns_metrics_since_the_previous_drain():
+    metrics = RequestMetrics()
+    metrics.record('PATCH', PATCH_URL, 0.02, status='200')
+    metrics.count_targets('migrated')
+
+    first = metrics.drain()
+    metrics.record('PATCH', PATCH_URL, 0.02, status='200')
+    second = metrics.drain()
+
+    assert first['endpoints']['PATCH /hidden/orgs/{org_id}/targets/{target_id}']['count'] == 1
+    assert first['targets'] == {'migrated': 1}
+    assert second['endpoints']['PATCH /hidden/orgs/{org_id}/targets/{target_id}']['count'] == 1
+    assert second['targets'] == {}
+    assert metrics.drain() == {'endpoints': {}, 'targets': {}}
+
+
+@pytest.mark.usefixtures('worker_state')
+def test_worker_metrics_of_several_orgs_are_counted_once(monkeypatch):
+    requests_per_org = {'org-a': 3, 'org-b': 5, 'org-c': 2}
+
+    def migrate_org(_snyk_token, org_id, _origins, **_options):
+        for _ in range(requests_per_org[org_id]):
+            state["metrics"].record('PATCH', PATCH_URL, 0.02, status='200')
+            state["metrics"].count_targets('migrated')
+            state["summary"].record(org_id, 'migrated')
+        return True
+
+    monkeypatch.setattr(main, 'migrate_org', migrate_org)
+    parent = RequestMetrics()
+
+    # one worker process handling every org in turn
+    for org_id in requests_per_org:
+        _, status, counts, metrics = main.migrate_org_worker('token', org_id, ['github-enterprise'], {})
+        parent.merge(metrics)
+
+        assert status == ''
+        assert counts == {'migrated': requests_per_org[org_id]}
+
+    total = sum(requests_per_org.values())
+
+    assert parent.report()['PATCH /hidden/orgs/{org_id}/targets/{target_id}']['count'] == total
+    assert parent.targets == {'migrated': total}
@@ -0,0 +1,50 @@
+"""Tests for plan-then-apply migrations
+"""
+
+import pytest
+from typer.testing import CliRunner
+
+from snyk_migrate_to_github_app import main
+from snyk_migrate_to_github_app.plan import MigrationPlan
+from snyk_migrate_to_github_app.target import Target
+
+
+def test_plan_round_trip(tmp_path):
+    path = str(tmp_path / 'plan.jsonl')
+    targets = [
+        Target('target-1', 'acme/api', 'github-enterprise', org_id='org-a'),
+        Target('target-2', 'acme/web', 'github', org_id='org-b'),
+    ]
+
+    plan = MigrationPlan(path, 'group', 'eu', 'github-cloud-app')
+
+    for target in targets:
+        plan.add(target)
+
+    plan.close()
+
+    header, planned = MigrationPlan.read(path)
+
+    assert {key: header[key] for key in ('org_id', 'tenant', 'source_type')} == {'org_id': 'group', 'tenant': 'eu', 'source_type': 'github-cloud-app'}
+    assert list(planned) == targets
+
+
+def test_empty_plan_is_discarded(tmp_path):
+    path = tmp_path / 'plan.jsonl'
+    plan = MigrationPlan(str(path), 'org', '', 'github-cloud-app')
+    plan.discard()
+
+    assert not path.exists()
+
+
+@pytest.mark.parametrize('option', [['--dry-run'], ['--plan-out', 'other.jsonl'], ['--count-only']])
+def test_apply_rejects_dry_runs(monkeypatch, option):
+    def apply_plan(*_args, **_kwargs):
+        raise AssertionError('the plan was applied')
+
+    monkeypatch.setattr(main, 'apply_plan', apply_plan)
+
+    result = CliRunner().invoke(main.app, ['org', 'token', '--apply', 'plan.jsonl', *option])
+
+    assert result.exit_code == 0
+    assert 'cannot be used with --plan-out, --dry-run or --count-only' in ' '.join(result.output.split())
@@ -0,0 +1,62 @@
+"""Tests for --shard partitioning
+"""
+
+import pytest
+
+from snyk_migrate_to_github_app.sharding import parse_shard, shard_orgs, shard_targets
+from snyk_migrate_to_github_app.target import Target
+
+
+@pytest.fixture
+def targets():
+    return [Target(f'target-{index}', f'repo-{index}', 'github-enterprise', org_id='org') for index in range(500)]
+
+
+@pytest.mark.parametrize('option, expected', [
+    ('0/1', (0, 1)),
+    ('0/4', (0, 4)),
+    ('3/4', (3, 4)),
+    ('12/100', (12, 100)),
+])
+def test_parse_shard(option, expected):
+    assert parse_shard(option) == expected
+
+
+@pytest.mark.parametrize('option', ['', '4/4', '5/4', '0/0', '1', '1/', '/4', '-1/4', 'a/b', '1/4/8', ' 1/4'])
+def test_parse_shard_rejects_invalid_options(option):
+    assert parse_shard(option) is None
+
+
+@pytest.mark.parametrize('count', [1, 2, 3, 7])
+def test_target_shards_are_disjoint_and_cover_every_target(targets, count):
+    slices = [list(shard_targets(targets, (index, count, 'target'))) for index in range(count)]
+
+    assert sum(len(owned) for owned in slices) == len(targets)
+    assert {target for owned in slices for target in owned} == set(targets)
+
+
+@pytest.mark.parametrize('count', [1, 2, 3, 7])
+def test_org_shards_are_disjoint_and_cover_every_org(count):
+    orgs = [(f'org-{index}', f'Org {index}') for index in range(50)]
+    slices = [shard_orgs(orgs, (index, count, 'org')) for index in range(count)]
+
+    assert sum(len(owned) for owned in slices) == len(orgs)
+    assert {org for owned in slices for org in owned} == set(orgs)
+
+
+def test_shards_are_stable(targets):
+    first = list(shard_targets(targets, (1, 3, 'target')))
+    second = list(shard_targets(list(reversed(targets)), (1, 3, 'target')))
+
+    assert first == list(reversed(second))
+
+
+def test_unsharded_runs_keep_everything(targets):
+    orgs = [('org-a', 'A'), ('org-b', 'B')]
+
+    assert list(shard_targets(targets, None)) == targets
+    assert shard_orgs(orgs, None) == orgs
+
+
+def test_sharding_by_org_keeps_every_target_of_the_org(targets):
+    assert list(shard_targets(targets, (0, 4, 'org'))) == targets
@@ -0,0 +1,201 @@
+"""Tests for rate limiting, retries and adaptive concurrency
+"""
+
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from snyk_migrate_to_github_app.constants import SNYK_AIMD_START, SNYK_RATE_LIMIT_DEFAULT, SNYK_RATE_LIMIT_FLOOR, SNYK_RATE_LIMIT_PAUSE_MAX
+from snyk_migrate_to_github_app.throttling import ConcurrencyController, RateLimiter, RetryPolicy, retry_after
+
+
+def make_response(status_code=200, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return response
+
+
+@pytest.mark.parametrize('headers, expected', [
+    ({}, 0),
+    ({'Retry-After': '5'}, 5),
+    ({'Retry-After': '0.5'}, 0.5),
+    ({'Retry-After': '-3'}, 0),
+    ({'Retry-After': 'soon'}, 0),
+    ({'X-RateLimit-Remaining': '3', 'X-RateLimit-Reset': '20'}, 0),
+    ({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '20'}, 20),
+    ({'RateLimit-Remaining': '0', 'RateLimit-Reset': '7'}, 7),
+    ({'Retry-After': '3', 'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '20'}, 3),
+])
+def test_retry_after(headers, expected):
+    assert retry_after(make_response(429, headers)) == expected
+
+
+def test_retry_after_reads_an_http_date():
+    delay = retry_after(make_response(429, {'Retry-After': formatdate(time.time() + 30, usegmt=True)}))
+
+    assert 28 <= delay <= 30
+
+
+def test_retry_after_reads_a_reset_timestamp():
+    delay = retry_after(make_response(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 30)}))
+
+    assert 28 <= delay <= 30
+
+
+def test_retry_after_ignores_a_reset_timestamp_in_the_past():
+    assert retry_after(make_response(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) - 30)})) == 0
+
+
+def test_retry_after_is_capped():
+    assert retry_after(make_response(429, {'Retry-After': '86400'})) == SNYK_RATE_LIMIT_PAUSE_MAX
+
+
+
+@pytest.mark.parametrize('attempt, ceiling', [(1, 0.5), (2, 1), (3, 2), (5, 8), (10, 10)])
+def test_backoff_is_jittered_below_a_capped_exponential(attempt, ceiling):
+    policy = RetryPolicy(base_delay=0.5, max_delay=10)
+    delays = [policy.backoff(attempt) for _ in range(200)]
+
+    assert all(0 <= delay <= ceiling for delay in delays)
+    assert max(delays) > ceiling / 2
+
+def test_rate_limiter_lets_a_burst_through():
+    limiter = RateLimiter(10)
+
+    assert sum(limiter.acquire() for _ in range(10)) == 0
+
+
+def test_rate_limiter_spaces_requests_once_the_burst_is_used():
+    limiter = RateLimiter(20)
+
+    for _ in range(20):
+        limiter.acquire()
+
+    assert limiter.acquire() > 0
+
+
+def test_rate_limiter_without_a_rate_never_waits():
+    limiter = RateLimiter(0)
+
+    assert sum(limiter.acquire() for _ in range(100)) == 0
+
+
+def test_throttled_response_halves_the_rate_once_per_cooldown():
+    limiter = RateLimiter(20)
+
+    assert limiter.update(make_response(429))
+    assert limiter.rate == 10
+
+    # a burst of concurrent 429s counts as one
+    limiter.update(make_response(429))
+    assert limiter.rate == 10
+
+    limiter.last_decrease -= 60
+    limiter.update(make_response(429))
+    assert limiter.rate == 5
+
+
+def test_rate_never_drops_below_the_floor():
+    limiter = RateLimiter(1)
+    limiter.update(make_response(429))
+
+    assert limiter.rate == SNYK_RATE_LIMIT_FLOOR
+
+
+def test_throttled_response_without_a_rate_starts_limiting():
+    limiter = RateLimiter(0)
+    limiter.update(make_response(429))
+
+    assert limiter.rate == SNYK_RATE_LIMIT_DEFAULT / 2
+
+
+def test_successes_recover_the_lost_rate():
+    limiter = RateLimiter(20)
+    limiter.update(make_response(429))
+
+    assert not limiter.update(make_response(200))
+    assert limiter.rate == pytest.approx(10.5)
+
+    for _ in range(200):
+        limiter.update(make_response(200))
+
+    assert limiter.rate == pytest.approx(20, abs=0.01)
+    assert limiter.rate <= 20
+
+
+def test_retry_after_pauses_every_caller():
+    limiter = RateLimiter(1000)
+    limiter.update(make_response(429, {'Retry-After': '0.2'}))
+
+    assert limiter.acquire() >= 0.15
+
+
+def test_reset_timestamp_pauses_for_a_bounded_time():
+    limiter = RateLimiter(1000)
+    limiter.update(make_response(200, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(int(time.time()) + 30)}))
+
+    assert limiter.paused_until - time.monotonic() <= 30
+
+
+def test_healthy_responses_grow_the_concurrency_by_one_per_window():
+    controller = ConcurrencyController(20)
+
+    for _ in range(SNYK_AIMD_START):
+        controller.acquire()
+        controller.release(0.1, True)
+
+    assert controller.limit == pytest.approx(SNYK_AIMD_START + 1, abs=0.1)
+
+
+def test_concurrency_never_exceeds_the_maximum():
+    controller = ConcurrencyController(5)
+
+    for _ in range(100):
+        controller.acquire()
+        controller.release(0.1, True)
+
+    assert controller.limit == 5
+
+
+def test_unhealthy_response_halves_the_concurrency_once_per_cooldown():
+    controller = ConcurrencyController(20, initial=16)
+    controller.last_decrease = float('-inf')
+
+    controller.acquire()
+    controller.release(0.1, False)
+    assert controller.current == 8
+
+    # concurrent failures within the cooldown count as one
+    controller.acquire()
+    controller.release(0.1, False)
+    assert controller.current == 8
+
+    controller.last_decrease -= 60
+    controller.acquire()
+    controller.release(0.1, False)
+    assert controller.current == 4
+
+
+def test_latency_well_above_the_best_halves_the_concurrency():
+    controller = ConcurrencyController(20, initial=16)
+    controller.last_decrease = float('-inf')
+
+    controller.acquire()
+    controller.release(0.1, True)
+    controller.acquire()
+    controller.release(2.0, True)
+
+    assert controller.current == 8
+
+
+def test_concurrency_never_drops_below_one():
+    controller = ConcurrencyController(20, initial=1)
+    controller.last_decrease = float('-inf')
+
+    controller.acquire()
+    controller.release(0.1, False)
+
+    assert controller.current == 1
@@ -0,0 +1,105 @@
+"""Tests for the SQLite work queue
+"""
+
+import time
+
+import pytest
+
+from snyk_migrate_to_github_app.target import Target
+from snyk_migrate_to_github_app.work_queue import WorkQueue
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'queue.db')
+
+
+@pytest.fixture
+def targets():
+    return [Target(f'target-{index}', f'repo-{index}', 'github-enterprise', org_id='org') for index in range(4)]
+
+
+def test_put_ignores_queued_targets(path, targets):
+    queue = WorkQueue(path, worker='a')
+
+    assert queue.put(targets) == 4
+    assert queue.put(targets[:2]) == 0
+    assert queue.counts() == {'pending': 4}
+
+
+def test_lease_hands_out_each_target_once(path, targets):
+    first = WorkQueue(path, worker='a')
+    second = WorkQueue(path, worker='b')
+    first.put(targets)
+
+    leased = first.lease(3)
+
+    assert leased == targets[:3]
+    assert second.lease(3) == targets[3:]
+    assert first.lease(3) == []
+    assert first.counts() == {'leased': 4}
+
+
+def test_expired_lease_is_requeued(path, targets):
+    crashed = WorkQueue(path, worker='a', lease_timeout=0.05)
+    other = WorkQueue(path, worker='b')
+    crashed.put(targets[:1])
+    crashed.lease(1)
+
+    assert other.lease(1) == []
+
+    time.sleep(0.1)
+
+    assert other.lease(1) == targets[:1]
+
+
+def test_renew_keeps_lease(path, targets):
+    owner = WorkQueue(path, worker='a', lease_timeout=0.2)
+    other = WorkQueue(path, worker='b')
+    owner.put(targets[:1])
+    owner.lease(1)
+
+    for _ in range(3):
+        time.sleep(0.1)
+        assert owner.renew() == 1
+
+    assert other.lease(1) == []
+
+
+def test_complete_records_outcome(path, targets):
+    queue = WorkQueue(path, worker='a')
+    queue.put(targets[:2])
+    queue.lease(2)
+
+    assert queue.complete(targets[0], 'migrated')
+    assert queue.complete(targets[1], 'failed')
+    assert queue.counts() == {'done': 1, 'failed': 1}
+    assert queue.lease(2) == []
+
+
+def test_complete_needs_the_lease(path, targets):
+    stale = WorkQueue(path, worker='a', lease_timeout=0.05)
+    current = WorkQueue(path, worker='b')
+    stale.put(targets[:1])
+    stale.lease(1)
+    time.sleep(0.1)
+    current.lease(1)
+
+    assert not stale.complete(targets[0], 'failed')
+    assert current.complete(targets[0], 'migrated')
+    assert not stale.complete(targets[0], 'failed')
+    assert current.connection.execute('SELECT outcome FROM targets').fetchone() == ('migrated',)
+
+
+def test_retry_failed_queues_failed_targets_again(path, targets):
+    queue = WorkQueue(path, worker='a')
+    queue.put(targets[:2])
+    queue.lease(2)
+    queue.complete(targets[0], 'migrated')
+    queue.complete(targets[1], 'failed')
+
+    assert queue.retry_failed() == 1
+    assert queue.counts() == {'done': 1, 'pending': 1}
+    assert queue.outcomes() == {'migrated': 1}
+    assert queue.lease(2) == targets[1:2]
+    assert queue.retry_failed() == 0